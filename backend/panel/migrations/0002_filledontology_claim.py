@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panel', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filledontology',
+            name='worker_id',
+            field=models.CharField(blank=True, default=None, max_length=128, null=True, verbose_name='Worker'),
+        ),
+        migrations.AddField(
+            model_name='filledontology',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panel', '0002_filledontology_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filledontology',
+            name='timings',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -14,3 +14,7 @@ class FilledOntology(models.Model):
     facts = models.FileField(upload_to='facts/', null=True, blank=True, default=None)
     result = models.FileField(upload_to='owl_filled/', null=True, blank=True, default=None)
     status = models.CharField('Status', max_length=128, default='pending')
+    worker_id = models.CharField('Worker', max_length=128, null=True, blank=True, default=None)
+    claimed_at = models.DateTimeField(null=True, blank=True, default=None)
+    # seconds per stage, input size and fact counts, written by the worker: {"parse": {...}, "fill": {...}}
+    timings = models.JSONField(null=True, blank=True, default=None)
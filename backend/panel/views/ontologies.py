@@ -65,7 +65,8 @@ class OntologyFillView(APIView):
             "id": onto.id,
             "name": onto.name,
             "created_at": onto.created_at,
-            "status": onto.status
+            "status": onto.status,
+            "timings": onto.timings
         } for onto in FilledOntology.objects.all()])
 
     @method_decorator(login_required)
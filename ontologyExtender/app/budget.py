@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import time
+
+from yargy.parser import Chart, prepare_trees, prepare_resolved_matches
+from yargy.rule.bnf import is_rule
+
+from app.metrics import PARSER_BUDGET_HITS
+
+STATES = 'states'
+DEADLINE = 'deadline'
+# interpreting a very long match goes deeper than the interpreter allows
+RECURSION = 'recursion'
+
+# states a rule creates between two looks at the clock
+CLOCK_INTERVAL = 256
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.limit = limit
+
+
+def check_deadline(deadline):
+    if time.monotonic() > deadline:
+        raise BudgetExceeded(DEADLINE)
+
+
+class Budget:
+    """
+    Earley states and wall-clock seconds all the rules run on one document
+    may spend together. A limit left at None is not enforced.
+
+    Rules that ran out of it are listed in `hits` as "rule:limit", the facts
+    of a document with hits are the ones found before the budget ran out.
+    """
+
+    def __init__(self, max_states=None, timeout=None):
+        self.max_states = max_states
+        # the monotonic clock is system-wide, the deadline holds in forked chunk workers as well
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.states = 0
+        self.hits = []
+
+    def limits(self, max_states=None, timeout=None):
+        """ state limit and deadline of a rule starting now, with its own limits on top of what is left """
+        states = self.max_states - self.states if self.max_states else None
+        if max_states:
+            states = max_states if states is None else min(states, max_states)
+        deadline = self.deadline
+        if timeout:
+            rule_deadline = time.monotonic() + timeout
+            deadline = rule_deadline if deadline is None else min(deadline, rule_deadline)
+        return states, deadline
+
+
+class BudgetedParser:
+    """
+    Runs a yargy parser within a budget: the chart stops growing once the
+    rule has created `max_states` states or spent `timeout` seconds, or once
+    the document budget runs out, and the matches completed by then are
+    returned instead of an error. The deadline bounds building the chart,
+    interpreting the matches found comes on top of it. A match too deep to
+    interpret stops the rule as well, with the facts of the matches before
+    it kept.
+
+    With a `prefilter` the rule is only started at the tokens it lets
+    through, the rest of the text adds no states unless a match started
+    before runs over it.
+    """
+
+    def __init__(self, parser, name, max_states=None, timeout=None, prefilter=None):
+        self.parser = parser
+        self.name = name
+        self.max_states = max_states
+        self.timeout = timeout
+        self.prefilter = prefilter
+
+    def findall(self, text, budget=None, tokens=None):
+        """
+        yields (match, fact) pairs. `tokens` of the text made by the parser's
+        tokenizer, the text is tokenized again without them
+        """
+        budget = budget or Budget()
+        chart = self.chart(text, budget, tokens)
+        try:
+            trees = sorted(prepare_trees(chart.matches(self.parser.rule)))
+            for match in prepare_resolved_matches(trees):
+                fact = match.fact
+                yield match, fact
+        except RecursionError:
+            self.exceeded(budget, RECURSION)
+
+    def exceeded(self, budget, limit):
+        budget.hits.append('{}:{}'.format(self.name, limit))
+        PARSER_BUDGET_HITS.inc(rule=self.name, limit=limit)
+
+    def chart(self, text, budget, tokens=None):
+        max_states, deadline = budget.limits(self.max_states, self.timeout)
+        chart = Chart([])
+        try:
+            # a rule starting past the deadline does not even tokenize the text
+            if deadline is not None:
+                check_deadline(deadline)
+            if tokens is None:
+                tokens = self.parser.tokenizer(text)
+            tokens = list(self.parser.tagger(tokens))
+            starts = self.prefilter.starts(tokens) if self.prefilter else None
+            if starts is None or starts:
+                chart = Chart(tokens)
+                self.fill(chart, max_states, deadline, starts)
+        except BudgetExceeded as exceeded:
+            self.exceeded(budget, exceeded.limit)
+        budget.states += sum(len(column.states) for column in chart.columns)
+        return chart
+
+    def fill(self, chart, max_states, deadline, starts=None):
+        """ same as yargy's Parser.chart, checking the limits as the columns fill up, starting the rule in `starts` """
+        parser = self.parser
+        # states of the columns already done
+        done = 0
+        # states processed since the clock was last read, over all the columns
+        unclocked = 0
+        for column, next_column in chart:
+            if starts is None or column.index in starts:
+                parser.predict(column, next_column, parser.rule)
+            for state in column:
+                if state.completed:
+                    parser.complete(column, state)
+                else:
+                    next_term = state.next_term
+                    if is_rule(next_term):
+                        parser.predict(column, next_column, next_term)
+                    elif next_column:
+                        parser.scan(next_column, next_term, state)
+                if max_states is not None:
+                    states = done + len(column.states) + (len(next_column.states) if next_column else 0)
+                    if states > max_states:
+                        raise BudgetExceeded(STATES)
+                unclocked += 1
+                if deadline is not None and unclocked >= CLOCK_INTERVAL:
+                    unclocked = 0
+                    check_deadline(deadline)
+            done += len(column.states)
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from app.env import EnvironmentVariables as EnvVariables
+from app.storage import CHUNK_SIZE
+
+
+def cache_dir():
+    return EnvVariables.CACHE_DIR.get_env(os.path.join(tempfile.gettempdir(), 'ontology-extender'))
+
+
+def content_key(*parts):
+    """
+    sha256 over the given parts, each one length-prefixed so that boundaries
+    matter. Parts are str, bytes or seekable binary files, which are hashed
+    chunk by chunk and rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        if isinstance(part, bytes):
+            digest.update(str(len(part)).encode('ascii') + b':')
+            digest.update(part)
+            continue
+        part.seek(0, os.SEEK_END)
+        digest.update(str(part.tell()).encode('ascii') + b':')
+        part.seek(0)
+        for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+        part.seek(0)
+    return digest.hexdigest()
+
+
+class LocalCache:
+    """
+    Least recently used files in a directory, bounded by their total size.
+    Safe to use from several threads; several processes may share the
+    directory, in which case each of them keeps its own bound.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.endswith('.tmp')]
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            self.entries[entry.name] = entry.stat().st_size
+            self.size += entry.stat().st_size
+        with self.lock:
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def exists(self, key):
+        with self.lock:
+            found = key in self.entries and os.path.exists(self._path(key))
+            if found:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # evicted by another process sharing the directory
+                self.size -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            # keeps the recency order across restarts, see __init__
+            os.utime(self._path(key))
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._add(key, lambda f: f.write(data))
+
+    def put_file(self, key, path):
+        if os.path.getsize(path) > self.max_bytes:
+            return
+
+        def copy(f):
+            with open(path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+        self._add(key, copy)
+
+    def _add(self, key, write):
+        # a name of its own for every writer: processes sharing the directory may store the same key at once
+        fd, tmp = tempfile.mkstemp(prefix=key + '.', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        with self.lock:
+            self.size -= self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.size += size
+            self._evict()
+
+
+class ObjectStoreCache:
+    """ Objects under a prefix of the S3 bucket, shared by every worker """
+
+    def __init__(self, storage, prefix):
+        self.storage = storage
+        self.s3 = storage.s3
+        self.bucket = storage.bucket
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return self.prefix + key
+
+    def exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=self.path(key))
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def get(self, key):
+        try:
+            data = self.s3.get_object(Bucket=self.bucket, Key=self.path(key))['Body'].read()
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=self.path(key), Body=data)
+
+    def put_file(self, key, path):
+        self.storage.upload_file(self.path(key), path)
+
+    def stats(self):
+        return {
+            'shared_hits': self.hits,
+            'shared_misses': self.misses,
+        }
+
+
+class TieredCache:
+    """ A local LRU in front of the shared object store """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def path(self, key):
+        """ S3 key of the shared copy """
+        return self.shared.path(key)
+
+    def exists(self, key):
+        return self.local.exists(key) or self.shared.exists(key)
+
+    def get(self, key):
+        data = self.local.get(key)
+        if data is None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.local.put(key, data)
+        return data
+
+    def put(self, key, data):
+        self.shared.put(key, data)
+        self.local.put(key, data)
+
+    def put_file(self, key, path):
+        self.shared.put_file(key, path)
+        self.local.put_file(key, path)
+
+    def stats(self):
+        return {
+            'local_hits': self.local.hits,
+            'local_misses': self.local.misses,
+            'local_evictions': self.local.evictions,
+            'local_bytes': self.local.size,
+            'shared_hits': self.shared.hits,
+            'shared_misses': self.shared.misses,
+        }
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import re
+
+from app.ontology import OntoFacts
+
+PARAGRAPH_END = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'[.!?…;]\s+|\n')
+SPACE = re.compile(r'\s+')
+
+# fact types a document has only one of: the first chunk that finds one wins
+SINGLE_FACTS = ['Scientist']
+
+
+def _last_boundary(pattern, text, lowest):
+    cut = None
+    for match in pattern.finditer(text):
+        if match.end() > lowest:
+            cut = match.end()
+    return cut
+
+
+def _cut(text, size):
+    """ position to cut the text at: the last paragraph, sentence or word end in its second half """
+    head = text[:size]
+    for pattern in [PARAGRAPH_END, SENTENCE_END, SPACE]:
+        cut = _last_boundary(pattern, head, size // 2)
+        if cut is not None:
+            return cut
+    return size
+
+
+def _restart(text, cut, overlap):
+    """ where the next chunk starts: `overlap` characters back, moved forward to a word start """
+    if overlap <= 0:
+        return cut
+    start = max(cut - overlap, 0)
+    match = SPACE.search(text, start, cut)
+    return match.end() if match else start
+
+
+def split_chunks(pieces, size, overlap=0):
+    """
+    Splits text, given as an iterable of str pieces, into (offset, chunk)
+    pairs of at most `size` characters cut at paragraph or sentence
+    boundaries where possible. Consecutive chunks share up to `overlap`
+    characters, so that facts crossing a boundary are seen whole by the
+    following chunk.
+    """
+    overlap = min(overlap, size // 2)
+    buffer = ''
+    offset = 0
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) > size:
+            cut = _cut(buffer, size)
+            yield offset, buffer[:cut]
+            start = _restart(buffer, cut, overlap)
+            buffer = buffer[start:]
+            offset += start
+    if buffer.strip():
+        yield offset, buffer
+
+
+def merge_facts(stage_names, chunks):
+    """
+    Merges per-chunk results into one OntoFacts. `chunks` holds, in document
+    order, (offset, groups) pairs where groups are (stage, start, stop, facts)
+    tuples with positions relative to the chunk.
+
+    A group belongs to the chunk its start falls in before the next chunk
+    begins, so matches repeated in an overlap are counted once. A chunk may
+    begin inside a match of the chunk before it and find the tail of that
+    match again, at another start: a group starting inside a match already
+    kept for its stage is dropped. Groups are ordered by stage first and by
+    position second: a document that fits one chunk gets exactly the ids an
+    unchunked parse gives it.
+    """
+    owned = []
+    for index, (offset, groups) in enumerate(chunks):
+        limit = chunks[index + 1][0] if index + 1 < len(chunks) else None
+        owned.append([
+            (stage, offset + start, offset + stop, group)
+            for stage, start, stop, group in groups
+            if limit is None or offset + start < limit
+        ])
+
+    facts = OntoFacts()
+    singles = set()
+    for stage_name in stage_names:
+        # absolute spans of the groups kept for the stage
+        kept = []
+        for groups in owned:
+            for stage, start, stop, group in groups:
+                if stage != stage_name:
+                    continue
+                if any(kept_start <= start < kept_stop for kept_start, kept_stop in kept):
+                    continue
+                kinds = {f[0] for f in group}
+                if kinds & singles:
+                    continue
+                singles.update(kinds.intersection(SINGLE_FACTS))
+                kept.append((start, stop))
+                facts.add_facts(group)
+    return facts
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+#   python -c "from app.compiled import main; main()"        compiles every grammar into the cache
+import hashlib
+import inspect
+import os
+import pickle
+import platform
+import stat
+import threading
+from importlib import metadata
+
+from yargy import Parser
+from yargy.interpretation.attribute import AttributeScheme, RepeatableAttribute
+from yargy.interpretation.fact import Fact, fact
+from yargy.tagger import PassTagger
+
+from app import grammars
+from app.env import EnvironmentVariables as EnvVariables
+
+# bump whenever the way grammars are stored changes
+CACHE_FORMAT = '1'
+# next to the code, where the image build compiles the grammars; never a shared directory like /tmp
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compiled_grammars')
+# libraries whose code ends up in a compiled grammar
+LIBRARIES = ['yargy', 'natasha', 'pymorphy2', 'pymorphy2-dicts-ru']
+
+RULES = {
+    'names': grammars.name_rule,
+    'department': grammars.department_rule,
+    'thesis': grammars.thesis_rule,
+}
+
+
+def grammar_key():
+    """ changes whenever a rule definition or a library the compiled rules depend on does """
+    parts = [CACHE_FORMAT, platform.python_version(), str(pickle.HIGHEST_PROTOCOL), inspect.getsource(grammars)]
+    for name in LIBRARIES:
+        try:
+            parts.append('{}={}'.format(name, metadata.version(name)))
+        except metadata.PackageNotFoundError:
+            parts.append('{}='.format(name))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def default_directory():
+    """ where the grammars are kept, None when the cache is turned off with an empty PARSER_GRAMMAR_CACHE """
+    return EnvVariables.PARSER_GRAMMAR_CACHE.get_env(DEFAULT_DIRECTORY) or None
+
+
+def trusted(f):
+    """ whether an open file was written by the user of the process and nobody else can change it """
+    status = os.fstat(f.fileno())
+    return status.st_uid == os.getuid() and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def compiled(rule, tokenizer):
+    """ a parser around a rule that is already compiled, skipping Parser.__init__ """
+    parser = Parser.__new__(Parser)
+    parser.tokenizer = tokenizer
+    parser.tagger = PassTagger()
+    parser.rule = rule
+    return parser
+
+
+def _fact(name, attributes):
+    return fact(name, [
+        AttributeScheme(key, default).repeatable() if repeatable else AttributeScheme(key, default)
+        for key, default, repeatable in attributes
+    ])
+
+
+def _derived_fact(name, base):
+    return type(name, (base,), {})
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Fact classes made by yargy's fact() cannot be pickled by reference, they
+    are pickled as the call making them again. Subclasses of those keep the
+    attributes but lose their own methods. The tokenizer and its morphology
+    are referred to, not stored: the unpickler plugs in the ones of the
+    process.
+    """
+
+    def __init__(self, file, tokenizer):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.shared = {id(tokenizer): 'tokenizer', id(tokenizer.morph): 'morph'}
+        raw = getattr(tokenizer.morph, 'raw', None)
+        if raw is not None:
+            self.shared[id(raw)] = 'raw'
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+    def reducer_override(self, obj):
+        if not isinstance(obj, type) or not issubclass(obj, Fact) or obj is Fact:
+            return NotImplemented
+        base = obj.__bases__[0]
+        if base is not Fact:
+            return _derived_fact, (obj.__name__, base)
+        return _fact, (obj.__name__, [
+            (key, getattr(getattr(obj, key), 'default', None), isinstance(getattr(obj, key), RepeatableAttribute))
+            for key in obj.__attributes__
+        ])
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, tokenizer):
+        super().__init__(file)
+        self.shared = {'tokenizer': tokenizer, 'morph': tokenizer.morph, 'raw': getattr(tokenizer.morph, 'raw', None)}
+
+    def persistent_load(self, pid):
+        return self.shared[pid]
+
+
+class GrammarCache:
+    """
+    Compiled grammars in a directory, one file per grammar named after the
+    grammar and grammar_key(), so a file is only used with the rules and
+    libraries it was compiled from. Loading a pickle runs code, so a file
+    another user owns or can write to is never loaded. A missing, untrusted
+    or unreadable file is compiled again and written in place of the ones of
+    older keys.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.key = grammar_key()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, '{}-{}.pickle'.format(name, self.key[:16]))
+
+    def parser(self, name, tokenizer):
+        path = self.path(name)
+        try:
+            with open(path, 'rb') as f:
+                if not trusted(f):
+                    raise PermissionError("not owned by the process user or writable by others")
+                rule = _Unpickler(f, tokenizer).load()
+            with self.lock:
+                self.hits += 1
+            return compiled(rule, tokenizer)
+        except FileNotFoundError:
+            pass
+        except Exception as error:
+            print("Compiled grammar {} is unreadable, compiling it again: ".format(path), error)
+
+        parser = Parser(RULES[name](), tokenizer=tokenizer)
+        with self.lock:
+            self.misses += 1
+        try:
+            self.store(name, parser.rule, tokenizer)
+        except OSError as error:
+            print("Could not store the compiled grammar {}: ".format(path), error)
+        return parser
+
+    def store(self, name, rule, tokenizer):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name)
+        tmp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            _Pickler(f, tokenizer).dump(rule)
+        os.replace(tmp, path)
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(name + '-') and entry.name.endswith('.pickle') and entry.path != path:
+                os.remove(entry.path)
+
+
+def build_parser(name, tokenizer, cache=None):
+    """ the parser of a grammar of RULES, from the cache when there is one """
+    if cache is None:
+        return Parser(RULES[name](), tokenizer=tokenizer)
+    return cache.parser(name, tokenizer)
+
+
+def main():
+    """ compiles every grammar into the cache, while building the image for instance """
+    from app.pipeline import Resources
+
+    directory = default_directory()
+    if directory is None:
+        raise SystemExit("PARSER_GRAMMAR_CACHE is empty, the grammar cache is turned off")
+    cache = GrammarCache(directory)
+    tokenizer = Resources().tokenizer
+    for grammar in RULES:
+        build_parser(grammar, tokenizer, cache)
+    print("Compiled grammars are in {}, {} already were".format(directory, cache.hits))
@@ -0,0 +1,193 @@
+import threading
+import time
+from json import dumps
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+TABLE = 'panel_filledontology'
+
+# jsonb columns: update_tasks merges the given objects into the stored ones
+JSON_COLUMNS = ['timings']
+
+# errors after which the connection is dropped and the transaction retried
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class Connection(extensions.connection):
+    """ psycopg2 connection that remembers its prepared statements and when it was last used """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.used_at = time.time()
+
+
+class Database:
+    """
+    Pool of up to `size` connections shared by the threads of a worker.
+
+    Work is passed to run() as a function of a cursor and runs in a
+    transaction of its own. A connection that was idle for longer than
+    `health_interval` seconds is checked before use; one that fails is
+    closed, and the transaction is retried on a fresh connection up to
+    `retries` times, so a restart of the database does not stop the worker.
+    """
+
+    def __init__(self, size=4, health_interval=30, retries=5, **params):
+        self.pool = pool.ThreadedConnectionPool(1, size, connection_factory=Connection, **params)
+        # ThreadedConnectionPool fails when it is exhausted instead of waiting
+        self.slots = threading.BoundedSemaphore(size)
+        self.health_interval = health_interval
+        self.retries = retries
+
+    def _connection(self):
+        while True:
+            connection = self.pool.getconn()
+            if not connection.closed and time.time() - connection.used_at < self.health_interval:
+                return connection
+            try:
+                if not connection.closed:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    connection.rollback()
+                    return connection
+            except CONNECTION_ERRORS:
+                pass
+            print("Dropping a broken PostgreSQL connection")
+            self.pool.putconn(connection, close=True)
+
+    def run(self, fn, *args, **kwargs):
+        """ calls fn(cursor, *args, **kwargs) in a transaction and returns its result """
+        attempt = 0
+        with self.slots:
+            while True:
+                connection = None
+                try:
+                    connection = self._connection()
+                    with connection.cursor() as cursor:
+                        result = fn(cursor, *args, **kwargs)
+                    connection.commit()
+                except CONNECTION_ERRORS as error:
+                    if connection is not None:
+                        self.pool.putconn(connection, close=True)
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise
+                    delay = min(2 ** attempt * 0.1, 5)
+                    reason = str(error).strip().splitlines()[0]
+                    print("PostgreSQL connection lost ({}), retrying in {:.1f}s".format(reason, delay))
+                    time.sleep(delay)
+                    continue
+                except BaseException:
+                    # the pool itself may fail before handing out a connection
+                    if connection is not None:
+                        if not connection.closed:
+                            connection.rollback()
+                        self.pool.putconn(connection, close=bool(connection.closed))
+                    raise
+                connection.used_at = time.time()
+                self.pool.putconn(connection)
+                return result
+
+    def close(self):
+        self.pool.closeall()
+
+
+def server_version(cursor):
+    cursor.execute("SELECT version();")
+    return cursor.fetchone()
+
+
+def execute_prepared(cursor, name, statement, types, args):
+    """
+    Runs the statement as a server-side prepared statement, preparing it the
+    first time the connection of the cursor sees it. `statement` uses $1, $2...
+    for the arguments, `types` are their SQL types.
+    """
+    connection = cursor.connection
+    if name not in connection.prepared:
+        cursor.execute("PREPARE {} ({}) AS {}".format(name, ', '.join(types), statement))
+        connection.prepared.add(name)
+    cursor.execute("EXECUTE {} ({})".format(name, ', '.join(['%s'] * len(args))), args)
+
+
+def fetch_tasks(cursor, ids, columns):
+    """ loads the given FilledOntology rows with one query, returns {id: {column: value}} """
+    execute_prepared(
+        cursor,
+        'fetch_' + '_'.join(columns),
+        "SELECT id, {} FROM {} WHERE id = ANY($1)".format(', '.join(columns), TABLE),
+        ['integer[]'],
+        [list(ids)]
+    )
+    return {row[0]: dict(zip(columns, row[1:])) for row in cursor.fetchall()}
+
+
+def claim_tasks(cursor, ids, columns, status, claimed_status, worker_id, timeout):
+    """
+    Atomically takes the given rows that are in `status` over for the worker:
+    moves them to `claimed_status` and stamps them with the worker id and the
+    time. Rows locked by a concurrent claim are skipped rather than waited
+    for. A row claimed more than `timeout` seconds ago is taken over as well,
+    its worker is considered dead. Returns {id: {column: value}} of the rows
+    the worker now owns.
+    """
+    execute_prepared(
+        cursor,
+        'claim_' + '_'.join(columns),
+        "UPDATE {0} AS t SET status = $3, worker_id = $4, claimed_at = now() "
+        "FROM (SELECT id FROM {0} WHERE id = ANY($1) "
+        "AND (status = $2 OR (status = $3 AND claimed_at < now() - $5 * interval '1 second')) "
+        "FOR UPDATE SKIP LOCKED) AS c "
+        "WHERE t.id = c.id RETURNING t.id, {1}".format(TABLE, ', '.join('t.' + column for column in columns)),
+        ['integer[]', 'text', 'text', 'text', 'integer'],
+        [list(ids), status, claimed_status, worker_id, timeout]
+    )
+    return {row[0]: dict(zip(columns, row[1:])) for row in cursor.fetchall()}
+
+
+def stale_tasks(cursor, claimed_status, timeout):
+    """ ids of the rows left in `claimed_status` for more than `timeout` seconds """
+    execute_prepared(
+        cursor,
+        'stale_tasks',
+        "SELECT id FROM {} WHERE status = $1 AND claimed_at < now() - $2 * interval '1 second'".format(TABLE),
+        ['text', 'integer'],
+        [claimed_status, timeout]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _assignment(column):
+    if column in JSON_COLUMNS:
+        return "{0} = coalesce(t.{0}, '{{}}'::jsonb) || v.{0}::jsonb".format(column)
+    return '{0} = v.{0}'.format(column)
+
+
+def update_tasks(cursor, columns, rows, worker_id=None):
+    """
+    Writes a batch of (id, value, ...) tuples with a single UPDATE ... FROM unnest(...)
+    statement. Values follow the order of `columns`; those of JSON_COLUMNS are dicts.
+    With a worker id, only rows still claimed by that worker are written.
+    """
+    if not rows:
+        return
+    owned = worker_id is not None
+    values = [list(column_values) for column_values in zip(*rows)]
+    for index, column in enumerate(columns):
+        if column in JSON_COLUMNS:
+            values[index + 1] = [None if value is None else dumps(value) for value in values[index + 1]]
+    execute_prepared(
+        cursor,
+        'update_' + '_'.join(columns) + ('_owned' if owned else ''),
+        "UPDATE {0} AS t SET {1} FROM unnest($1, {2}) AS v (id, {3}) WHERE t.id = v.id{4}".format(
+            TABLE,
+            ', '.join(_assignment(column) for column in columns),
+            ', '.join('${}'.format(index + 2) for index in range(len(columns))),
+            ', '.join(columns),
+            ' AND t.worker_id = ${}'.format(len(columns) + 2) if owned else ''
+        ),
+        ['integer[]'] + ['text[]'] * len(columns) + (['text'] if owned else []),
+        values + ([worker_id] if owned else [])
+    )
@@ -4,22 +4,56 @@ from enum import Enum
 
 class EnvironmentVariables(str, Enum):
     KAFKA_TOPIC = 'KAFKA_TOPIC'
+    KAFKA_FILL_TOPIC = 'KAFKA_FILL_TOPIC'
+    KAFKA_EVENTS_TOPIC = 'KAFKA_EVENTS_TOPIC'
     KAFKA_SERVER = 'KAFKA_SERVER'
     KAFKA_PORT = 'KAFKA_PORT'
+    KAFKA_GROUP_ID = 'KAFKA_GROUP_ID'
+    KAFKA_BATCH_SIZE = 'KAFKA_BATCH_SIZE'
     PG_USER = 'PG_USER'
     PG_PASSWORD = 'PG_PASSWORD'
     PG_HOST = 'PG_HOST'
     PG_PORT = 'PG_PORT'
+    PG_POOL_SIZE = 'PG_POOL_SIZE'
+    PG_HEALTH_CHECK_INTERVAL = 'PG_HEALTH_CHECK_INTERVAL'
+    PG_RETRIES = 'PG_RETRIES'
     PG_DATABASE = 'PG_DATABASE'
     PUSHER_APP_ID = 'PUSHER_APP_ID'
     PUSHER_APP_KEY = 'PUSHER_APP_KEY'
     PUSHER_APP_SECRET = 'PUSHER_APP_SECRET'
     PUSHER_CLUSTER = 'PUSHER_CLUSTER'
+    NOTIFY_SINK = 'NOTIFY_SINK'
+    NOTIFY_QUEUE_SIZE = 'NOTIFY_QUEUE_SIZE'
     AWS_ACCESS_KEY_ID = 'AWS_ACCESS_KEY_ID'
     AWS_SECRET_ACCESS_KEY = 'AWS_SECRET_ACCESS_KEY'
     AWS_STORAGE_BUCKET_NAME = 'AWS_STORAGE_BUCKET_NAME'
     AWS_REGION_NAME = 'AWS_S3_REGION_NAME'
     AWS_S3_ENDPOINT_URL = 'AWS_S3_ENDPOINT_URL'
+    PARSER_STAGES = 'PARSER_STAGES'
+    PARSER_CHUNK_SIZE = 'PARSER_CHUNK_SIZE'
+    PARSER_CHUNK_OVERLAP = 'PARSER_CHUNK_OVERLAP'
+    PARSER_CHUNK_WORKERS = 'PARSER_CHUNK_WORKERS'
+    PARSER_MAX_STATES = 'PARSER_MAX_STATES'
+    PARSER_TIMEOUT = 'PARSER_TIMEOUT'
+    PARSER_RULE_MAX_STATES = 'PARSER_RULE_MAX_STATES'
+    PARSER_RULE_TIMEOUT = 'PARSER_RULE_TIMEOUT'
+    PARSER_GRAMMAR_CACHE = 'PARSER_GRAMMAR_CACHE'
+    PARSER_MORPH_CACHE_SIZE = 'PARSER_MORPH_CACHE_SIZE'
+    WORKER_ROLE = 'WORKER_ROLE'
+    PARSE_PROCESSES = 'PARSE_PROCESSES'
+    FILL_PROCESSES = 'FILL_PROCESSES'
+    FILL_CONCURRENCY = 'FILL_CONCURRENCY'
+    FILL_TIMEOUT = 'FILL_TIMEOUT'
+    FILL_BACKEND = 'FILL_BACKEND'
+    MAX_INPUT_SIZE = 'MAX_INPUT_SIZE'
+    CACHE_DIR = 'CACHE_DIR'
+    FACTS_CACHE_SIZE = 'FACTS_CACHE_SIZE'
+    QUEUE_REPORT_INTERVAL = 'QUEUE_REPORT_INTERVAL'
+    METRICS_PORT = 'METRICS_PORT'
+    CLAIM_TIMEOUT = 'CLAIM_TIMEOUT'
+    MAX_ATTEMPTS = 'MAX_ATTEMPTS'
+    RETRY_BACKOFF = 'RETRY_BACKOFF'
+    RETRY_MAX_DELAY = 'RETRY_MAX_DELAY'
 
     def get_env(self, variable=None):
         return os.environ.get(self, variable)
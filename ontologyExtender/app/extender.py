@@ -1,9 +1,133 @@
 # call ./bin/OntologyExtender
 import os
+import resource
+import shutil
+import signal
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-print("Ontology Extender")
+BINARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'OntologyExtender')
 
-os.system('chmod +x ./bin/OntologyExtender')
-os.system('./bin/OntologyExtender')
+# 'binary' runs OntologyExtender, 'native' fills the ontology in process with app.filler
+BINARY_BACKEND = 'binary'
+NATIVE_BACKEND = 'native'
+BACKENDS = [BINARY_BACKEND, NATIVE_BACKEND]
 
-print("Ontology Extender finished")
\ No newline at end of file
+
+class ExtenderError(Exception):
+    pass
+
+
+class ExtenderRun:
+    """ Outcome of one OntologyExtender run """
+
+    def __init__(self, returncode, wall_time, peak_rss, result):
+        self.returncode = returncode
+        self.wall_time = wall_time
+        # kilobytes, as reported by the kernel for the child process
+        self.peak_rss = peak_rss
+        # path of result.owl in the scratch directory
+        self.result = result
+
+    def __str__(self):
+        return 'exit code {}, {:.2f}s, peak RSS {} MB'.format(self.returncode, self.wall_time, self.peak_rss // 1024)
+
+
+class FillExecutor:
+    """
+    Runs fill jobs on a bounded thread pool. Every run gets its own scratch
+    directory for ontology.owl, facts.xml and result.owl, so several runs can
+    share a container.
+
+    The binary backend starts OntologyExtender for every job. The native one
+    fills the ontology in the worker process, without the process start-up
+    and the input files; being bound to the interpreter lock, it gains nothing
+    from a concurrency above the number of fill processes.
+    """
+
+    def __init__(self, concurrency=1, timeout=None, binary=BINARY, backend=BINARY_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError("Unknown fill backend: {}".format(backend))
+        self.backend = backend
+        self.binary = binary
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='extender')
+        if backend == BINARY_BACKEND:
+            mode = os.stat(self.binary).st_mode
+            if not mode & stat.S_IXUSR:
+                os.chmod(self.binary, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    @contextmanager
+    def run(self, owl_file, facts_file):
+        """
+        fills the ontology in a fresh directory from the given binary file
+        objects and yields an ExtenderRun; its result path is valid inside the block
+        """
+        with tempfile.TemporaryDirectory(prefix='fill-') as workdir:
+            if self.backend == NATIVE_BACKEND:
+                run = self.run_native(workdir, owl_file, facts_file)
+            else:
+                run = self.run_binary(workdir, owl_file, facts_file)
+            if run.returncode != 0 or run.result is None:
+                raise ExtenderError("Fill failed with {}".format(run))
+            yield run
+
+    def run_native(self, workdir, owl_file, facts_file):
+        # imported here: the binary backend does not need rdflib
+        from app.filler import fill
+
+        started_at = time.time()
+        result_path = os.path.join(workdir, 'result.owl')
+        fill(owl_file, facts_file, result_path)
+        # the worker process as a whole, the filler has no process of its own
+        run = ExtenderRun(0, time.time() - started_at, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, result_path)
+        print("Native filler finished:", run)
+        return run
+
+    def run_binary(self, workdir, owl_file, facts_file):
+        with open(os.path.join(workdir, 'ontology.owl'), 'wb') as f:
+            shutil.copyfileobj(owl_file, f)
+
+        with open(os.path.join(workdir, 'facts.xml'), 'wb') as f:
+            shutil.copyfileobj(facts_file, f)
+
+        started_at = time.time()
+        process = subprocess.Popen([self.binary], cwd=workdir)
+        timer = None
+        if self.timeout:
+            # not process.kill(): it may reap the child before wait4 gets to it
+            timer = threading.Timer(self.timeout, os.kill, (process.pid, signal.SIGKILL))
+            timer.start()
+        try:
+            # wait4 reports the resource usage of this child alone
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+        result_path = os.path.join(workdir, 'result.owl')
+        run = ExtenderRun(process.returncode, time.time() - started_at, usage.ru_maxrss,
+                          result_path if os.path.exists(result_path) else None)
+        print("OntologyExtender finished:", run)
+        return run
+
+
+if __name__ == '__main__':
+    print("Ontology Extender")
+
+    os.system('chmod +x ./bin/OntologyExtender')
+    os.system('./bin/OntologyExtender')
+
+    print("Ontology Extender finished")
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# facts.xml as the fill step reads it, kept apart from the parser so writing it loads no grammar libraries
+import xml.etree.ElementTree as ET
+
+
+def build_xml(items, url):
+    xml = ET.Element('fdo_objects')
+    document = ET.SubElement(xml, 'document')
+    document.set('url', url)
+    document.set('date', '')
+    facts_element = ET.SubElement(document, 'facts')
+    for item in items:
+        fact_element = ET.SubElement(facts_element, 'Fact')
+        fact_element.set('FactID', str(item.id))
+        fact_element.set('LeadID', str(item.id))
+        for f in item.facts:
+            if f.value:
+                field = ET.SubElement(fact_element, f.type)
+                field.set('val', f.value)
+
+    return xml
+
+
+def get_xml(items, url):
+    return ET.tostring(build_xml(items, url), encoding='utf-8', method='xml').decode('utf-8')
+
+
+def write_xml(items, url, fileobj):
+    """ serializes the facts straight into a binary file object, same output as get_xml """
+    ET.ElementTree(build_xml(items, url)).write(fileobj, encoding='utf-8', method='xml')
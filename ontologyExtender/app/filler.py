@@ -0,0 +1,174 @@
+# in-process replacement for ./bin/OntologyExtender
+import itertools
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS
+
+from app.ontology import OntoFacts
+
+# restrictions a class puts on a property that name the class of the values
+RESTRICTION_CLASSES = [OWL.someValuesFrom, OWL.allValuesFrom, OWL.onClass]
+
+
+def local_name(uri):
+    uri = str(uri)
+    for separator in ['#', '/']:
+        if separator in uri:
+            uri = uri.rsplit(separator, 1)[1]
+    return uri
+
+
+def read_facts(fileobj):
+    """ reads facts.xml as written by app.facts_xml.write_xml back into OntoFacts """
+    facts = OntoFacts()
+    for fact in ET.parse(fileobj).getroot().iter('Fact'):
+        facts.add_facts([[field.tag.strip(), field.get('val')] for field in fact if field.get('val')])
+    return facts
+
+
+def merged_facts(facts):
+    """
+    The (type, value) lists the binary fills the ontology from, one per
+    combination of the groups of a document. Groups with the same set of fact
+    types are alternatives: a combination takes one group of every set, in
+    the order the sets first appear, and a type met twice keeps its first
+    value. So a lone Scientist is merged into every department and thesis,
+    two theses with the same fields never into each other, and of two theses
+    with different fields only the first title is kept, with the fields of
+    both.
+    """
+    alternatives = {}
+    for group in facts:
+        fields = [(fact.type.strip(), fact.value) for fact in group if fact.value]
+        if fields:
+            alternatives.setdefault(frozenset(fact_type for fact_type, _ in fields), []).append(fields)
+    for combination in itertools.product(*alternatives.values()):
+        merged = {}
+        for fields in combination:
+            for fact_type, value in fields:
+                merged.setdefault(fact_type, value)
+        if merged:
+            yield list(merged.items())
+
+
+class OntologyFiller:
+    """
+    Applies fact groups to an ontology loaded with rdflib, the way the
+    OntologyExtender binary does it:
+
+    - a fact whose type matches the label or the local name of a class
+      becomes a named individual of that class labeled with the fact value;
+    - two facts are linked by an object property when the ontology relates
+      their classes, either through the rdfs:domain and rdfs:range of the
+      property or through a restriction on the property that the first class
+      is declared a subclass of. Only properties with an rdfs:label are used,
+      the binary builds its patterns from the labels;
+    - facts are linked within the merged facts of a document, see
+      merged_facts(): the Scientist gets linked to every department and
+      thesis, a thesis never to the speciality of another one.
+
+    Individuals are reused by class and label, so a value met twice, in one
+    document or in the ontology already, is added once.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.base = self._base()
+        self.classes = {}
+        self.relations = defaultdict(set)
+        self.individuals = {}
+        # next free number in the individual URIs, per class
+        self.numbers = defaultdict(lambda: 1)
+        self._load_classes()
+        self._load_relations()
+        self._load_individuals()
+
+    @classmethod
+    def load(cls, owl_file):
+        graph = Graph()
+        graph.parse(owl_file, format='xml')
+        return cls(graph)
+
+    def _base(self):
+        for ontology in self.graph.subjects(RDF.type, OWL.Ontology):
+            return str(ontology).rstrip('#')
+        return 'http://www.semanticweb.org/ontology'
+
+    def _load_classes(self):
+        for owl_class in self.graph.subjects(RDF.type, OWL.Class):
+            if not isinstance(owl_class, URIRef):
+                continue
+            self.classes.setdefault(local_name(owl_class), owl_class)
+            for label in self.graph.objects(owl_class, RDFS.label):
+                self.classes.setdefault(str(label).strip(), owl_class)
+
+    def _load_relations(self):
+        labeled = {prop for prop in self.graph.subjects(RDF.type, OWL.ObjectProperty)
+                   if (prop, RDFS.label, None) in self.graph}
+        for prop in labeled:
+            for domain in self.graph.objects(prop, RDFS.domain):
+                for range_class in self.graph.objects(prop, RDFS.range):
+                    self.relations[(domain, range_class)].add(prop)
+
+        for owl_class, restriction in self.graph.subject_objects(RDFS.subClassOf):
+            prop = self.graph.value(restriction, OWL.onProperty)
+            if prop not in labeled:
+                continue
+            for predicate in RESTRICTION_CLASSES:
+                for range_class in self.graph.objects(restriction, predicate):
+                    self.relations[(owl_class, range_class)].add(prop)
+
+    def _load_individuals(self):
+        for individual in self.graph.subjects(RDF.type, OWL.NamedIndividual):
+            for owl_class in self.graph.objects(individual, RDF.type):
+                for label in self.graph.objects(individual, RDFS.label):
+                    self.individuals.setdefault((owl_class, str(label)), individual)
+
+    def _new_uri(self, owl_class):
+        name = local_name(owl_class)
+        while True:
+            uri = URIRef('{}#{}{}'.format(self.base, name, self.numbers[name]))
+            self.numbers[name] += 1
+            if (uri, None, None) not in self.graph:
+                return uri
+
+    def individual(self, owl_class, label):
+        """ the individual of the class with the label, created if needed """
+        individual = self.individuals.get((owl_class, label))
+        if individual is None:
+            individual = self._new_uri(owl_class)
+            self.graph.add((individual, RDF.type, OWL.NamedIndividual))
+            self.graph.add((individual, RDF.type, owl_class))
+            self.graph.add((individual, RDFS.label, Literal(label)))
+            self.individuals[(owl_class, label)] = individual
+        return individual
+
+    def apply(self, facts):
+        """ adds the facts of one document, returns the number of individuals used """
+        used = set()
+        for merged in merged_facts(facts):
+            found = []
+            for fact_type, value in merged:
+                owl_class = self.classes.get(fact_type)
+                if owl_class is not None:
+                    found.append((owl_class, self.individual(owl_class, value)))
+            for subject_class, subject in found:
+                for object_class, obj in found:
+                    if subject == obj:
+                        continue
+                    for prop in self.relations.get((subject_class, object_class), ()):
+                        self.graph.add((subject, prop, obj))
+            used.update(individual for _, individual in found)
+        return len(used)
+
+    def save(self, destination):
+        self.graph.serialize(destination=destination, format='xml')
+
+
+def fill(owl_file, facts_file, destination):
+    """ fills the ontology from binary file objects and writes the result to the destination path """
+    filler = OntologyFiller.load(owl_file)
+    filler.apply(read_facts(facts_file))
+    filler.save(destination)
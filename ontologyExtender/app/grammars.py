@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from yargy import rule, not_, or_
+from yargy.interpretation import fact
+from yargy.pipelines import morph_pipeline
+from yargy.predicates import eq, in_, normalized, dictionary, type as token_type
+from yargy.tokenizer import QUOTES
+
+# bump GRAMMAR_VERSION in app/versions.py whenever a rule below changes
+QUOTE = in_(QUOTES)
+HYPHEN = dictionary(['-', '—', '–'])
+# same as natasha's INT, without loading natasha for it
+INT = token_type('INT')
+
+DEPARTMENT_WORDS = ['кафедра', 'отдел']
+DISSERTATION_TYPES = ['кандидатская', 'докторская', 'магистерская']
+DISSERTATION_WORDS = ['диссертация']
+
+# every match of a rule starts with a form of one of these words, its parser skips the text before them
+TRIGGERS = {
+    'department': DEPARTMENT_WORDS,
+    'thesis': DISSERTATION_TYPES + DISSERTATION_WORDS,
+}
+
+
+def department_rule():
+    Department = fact(
+        'Department',
+        ['definition', 'name', 'position']
+    )
+
+    POSITION = rule(
+        morph_pipeline([
+            'доцент',
+            'аспирант',
+            'ассистент',
+            'профессор'
+        ])
+    )
+
+    NAME = rule(
+        QUOTE,
+        not_(QUOTE).repeatable(),
+        QUOTE
+    )
+    DEFINITION = rule(
+        morph_pipeline(DEPARTMENT_WORDS),
+        NAME
+    ).interpretation(Department.definition)
+    POSITION_SET = rule(HYPHEN, POSITION.interpretation(Department.position))
+
+    department = rule(DEFINITION, POSITION_SET).interpretation(Department)
+
+    return department
+
+
+def thesis_rule():
+    DISERTATION_TYPE = rule(
+        morph_pipeline(DISSERTATION_TYPES)
+    )
+
+    Thesis = fact(
+        'Thesis',
+        ['kind', 'title', 'speciality', 'degree', 'branch']
+    )
+
+    TITLE = rule(
+        not_(QUOTE).repeatable().optional(),
+        QUOTE,
+        not_(QUOTE).repeatable().interpretation(Thesis.title),
+        QUOTE
+    )
+
+    THESIS_NAME = rule(
+        DISERTATION_TYPE.optional().interpretation(Thesis.kind),
+        morph_pipeline(DISSERTATION_WORDS),
+        TITLE
+    ).interpretation(Thesis)
+
+    DEGREE_TYPE = rule(
+        or_(normalized('кандидат'), normalized('доктор'))
+    )
+
+    Speciality = fact(
+        'Speciality',
+        ['code', 'hyphen', 'name']
+    )
+
+    SPECIALITY_CODE = rule(
+        rule(
+            INT.repeatable(),
+            eq('.'),
+            INT.repeatable(),
+            eq('.'),
+            INT.repeatable()
+        ).interpretation(Speciality.code),
+        HYPHEN.interpretation(Speciality.hyphen)
+    )
+
+    SPECIALITY_TITLE = rule(
+        SPECIALITY_CODE,
+        or_(rule(
+            QUOTE,
+            not_(QUOTE).repeatable().interpretation(Speciality.name),
+            QUOTE
+        ), rule(
+            not_(or_(
+                eq('.'),
+                eq(';'))
+            ).repeatable().interpretation(Speciality.name)
+        ))
+    ).interpretation(Speciality)
+
+    SCIENCE_DIRECTION = rule(
+        morph_pipeline([
+            'направление',
+            'специальность'
+        ])
+    )
+
+    Branch = fact(
+        'Branch',
+        ['name']
+    )
+
+    BRANCH = rule(
+        not_(eq('наук')).repeatable().interpretation(Branch.name.normalized()),
+    ).interpretation(Branch)
+
+    AcademicDegree = fact(
+        'AcademicDegree',
+        ['degree', 'branch', 'suffix']
+    )
+
+    ACADEMIC_DEGREE = rule(
+        DEGREE_TYPE.interpretation(AcademicDegree.degree.normalized()),
+        BRANCH.interpretation(AcademicDegree.branch),
+        eq('наук').interpretation(AcademicDegree.suffix)
+    ).interpretation(AcademicDegree)
+
+    SPECIALITY_DEGREE = rule(
+        not_(or_(eq('кандидата'), eq('доктора'))).repeatable(),
+        ACADEMIC_DEGREE.interpretation(Thesis.degree)
+    )
+
+    SPECIALITY = rule(
+        SPECIALITY_DEGREE.optional(),
+        eq('по'),
+        SCIENCE_DIRECTION,
+        SPECIALITY_TITLE.interpretation(Thesis.speciality)
+    )
+
+    thesis = rule(THESIS_NAME, SPECIALITY.optional()).interpretation(Thesis)
+
+    return thesis
+
+
+def name_rule():
+    """ the person name grammar of natasha's NamesExtractor """
+    from natasha.grammars.name import NAME
+    return NAME
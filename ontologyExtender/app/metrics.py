@@ -0,0 +1,213 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from a cache hit to a long OntologyExtender run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """ (suffix, label values, extra labels, value) tuples """
+        with self.lock:
+            return [('', key, (), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        for suffix, key, extra, value in self.samples():
+            labels = _labels(self.labelnames, key, extra)
+            lines.append('{}{}{} {}'.format(self.name, suffix, labels, repr(float(value))))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def remove_all(self):
+        with self.lock:
+            self.values.clear()
+
+    @contextmanager
+    def track(self, **labels):
+        """ counts the block as in progress while it runs """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            if key not in self.values:
+                # bucket counts, sum, count
+                self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state = self.values[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started_at = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - started_at, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                for bound, bucket in zip(self.buckets, counts):
+                    samples.append(('_bucket', key, [('le', repr(float(bound)))], bucket))
+                samples.append(('_bucket', key, [('le', '+Inf')], count))
+                samples.append(('_sum', key, (), total))
+                samples.append(('_count', key, (), count))
+        return samples
+
+
+class Collector(Metric):
+    """ metric read from other objects when it is scraped: `collect` returns {label values: value} """
+
+    def __init__(self, name, documentation, labelnames, kind, collect):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        return [('', tuple(str(v) for v in key), (), value) for key, value in self.collect().items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'ontology_stage_seconds', 'Time spent in one stage of a job', ['role', 'stage']))
+JOBS = REGISTRY.register(Counter(
+    'ontology_jobs_total', 'Jobs by outcome: done, retried, recovered or dead_lettered', ['role', 'outcome']))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'ontology_jobs_in_flight', 'Jobs being processed', ['role']))
+CONSUMER_LAG = REGISTRY.register(Gauge(
+    'ontology_consumer_lag', 'Messages behind the end of an assigned partition', ['topic', 'partition']))
+PARSER_BUDGET_HITS = REGISTRY.register(Counter(
+    'ontology_parser_budget_hits_total', 'Rules cut short by a states or deadline budget', ['rule', 'limit']))
+
+
+class JobTimings(dict):
+    """ seconds spent in each stage of one job; every stage is observed in STAGE_SECONDS as well """
+
+    def __init__(self, role):
+        super().__init__()
+        self.role = role
+
+    @contextmanager
+    def stage(self, name):
+        started_at = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - started_at)
+
+    def add(self, name, seconds):
+        self[name] = round(seconds, 4)
+        STAGE_SECONDS.observe(seconds, role=self.role, stage=name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port):
+    """ serves /metrics on the port from a daemon thread """
+    server = ThreadingHTTPServer(('', port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    print("Metrics are served on port", port)
+    return server
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+
+from yargy.morph import MorphAnalyzer
+
+
+class CachedMorphAnalyzer(MorphAnalyzer):
+    """
+    yargy's MorphAnalyzer remembering the forms of the `capacity` least
+    recently used words, so a word seen in an earlier document is not
+    analyzed by pymorphy again. Normal forms are read from the same forms.
+    Words are looked up lower-cased, pymorphy analyzes them that way. The
+    forms are shared by every token of the word, nothing changes them.
+    Safe to use from several threads; 0 turns the cache off.
+    """
+
+    def __init__(self, raw=None, capacity=0):
+        super().__init__(raw)
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, word):
+        key = word.lower()
+        with self.lock:
+            forms = self.entries.get(key)
+            if forms is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return forms
+            self.misses += 1
+        forms = MorphAnalyzer.__call__(self, word)
+        if self.capacity:
+            with self.lock:
+                self.entries[key] = forms
+                while len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return forms
+
+    def count(self, hits, misses):
+        """ adds lookups made by another process, a chunk pool child for instance """
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.metrics import STAGE_SECONDS
+
+# Pusher accepts at most this many events in one batch trigger
+BATCH_SIZE = 10
+
+
+class PusherSink:
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, events):
+        self.client.trigger_batch([
+            {'channel': channel, 'name': name, 'data': data}
+            for channel, name, data in events
+        ])
+
+
+class LogSink:
+    """ prints the events instead of sending them, for local runs """
+
+    def send(self, events):
+        for channel, name, data in events:
+            print("Notification {} {}: {}".format(channel, name, data))
+
+
+class NullSink:
+    def send(self, events):
+        pass
+
+
+class Notifier:
+    """
+    Sends events from a background thread, so a slow or failing provider
+    never holds up a job.
+
+    Pending events are keyed by (channel, name, task id): a newer event for
+    the same task replaces the one still waiting. Up to `max_pending` events
+    wait at a time, the oldest ones are dropped beyond that. Events go out
+    in batches and a failed batch is retried `retries` times with a growing
+    delay before it is given up.
+    """
+
+    def __init__(self, sink, max_pending=1000, retries=3, backoff=0.5):
+        self.sink = sink
+        self.max_pending = max_pending
+        self.retries = retries
+        self.backoff = backoff
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._loop, name='notifier', daemon=True)
+        self.thread.start()
+
+    def notify(self, channel, name, task_id, data):
+        key = (channel, name, task_id)
+        with self.condition:
+            if key in self.pending:
+                del self.pending[key]
+                self.coalesced += 1
+            elif len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[key] = data
+            self.condition.notify()
+
+    def _take(self):
+        with self.condition:
+            while not self.pending and not self.stopping:
+                self.condition.wait()
+            events = []
+            while self.pending and len(events) < BATCH_SIZE:
+                (channel, name, _), data = self.pending.popitem(last=False)
+                events.append((channel, name, data))
+            return events
+
+    def _send(self, events):
+        for attempt in range(self.retries + 1):
+            try:
+                with STAGE_SECONDS.time(role='fill', stage='notify'):
+                    self.sink.send(events)
+                self.sent += len(events)
+                return
+            except Exception as error:
+                if attempt == self.retries:
+                    self.failed += len(events)
+                    print("Notification failed, {} events dropped: ".format(len(events)), error)
+                    return
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _loop(self):
+        while True:
+            events = self._take()
+            if not events:
+                return
+            self._send(events)
+
+    def close(self, timeout=10):
+        """ sends what is still pending, waiting up to `timeout` seconds """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
@@ -1,3 +1,6 @@
+import json
+
+
 class OntoFact:
     def __init__(self, fact_type, value):
         self.type = fact_type
@@ -33,6 +36,8 @@ class OntoFacts:
     def __init__(self):
         self.groups = []
         self.last_id = 0
+        # "rule:limit" of the rules that ran out of budget, the facts are partial when it is not empty
+        self.degraded = []
 
     def __iter__(self):
         return iter(self.groups)
@@ -55,3 +60,14 @@ class OntoFacts:
         for f in facts:
             group.add_fact(OntoFact(fact_type=f[0], value=f[1]))
         self.add_group(group)
+
+    def dumps(self):
+        """ serializes the groups to JSON, ids are implied by the order """
+        return json.dumps([[[f.type, f.value] for f in group] for group in self.groups], ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, data):
+        facts = cls()
+        for group in json.loads(data):
+            facts.add_facts(group)
+        return facts
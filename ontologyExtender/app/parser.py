@@ -1,31 +1,16 @@
 # -*- coding: utf-8 -*-
-import xml.etree.ElementTree as ET
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from xml.dom.minidom import parseString
 
-from natasha import NamesExtractor, MorphVocab, Segmenter, Doc, NewsEmbedding, NewsMorphTagger, NewsSyntaxParser
-from natasha.grammars.addr import DOT, INT
-from yargy import Parser, rule, not_, or_, predicates
-from yargy.interpretation.normalizer import Normalizer
-from yargy.predicates import (
-    eq, type, caseless, in_, in_caseless,
-    gte, lte, length_eq,
-    is_capitalized, normalized,
-    dictionary, gram,
-)
-from yargy.interpretation import fact
-from yargy.pipelines import morph_pipeline
-from yargy.predicates import eq
-from yargy.relations import gnc_relation
-from yargy.tokenizer import (
-    QUOTES,
-    LEFT_QUOTES,
-    RIGHT_QUOTES,
-
-    MorphTokenizer,
-    TokenRule, OTHER, EOL
-)
-
-from app.ontology import OntoFacts, OntoGroup, OntoFact
+from app.budget import Budget
+from app.chunking import split_chunks, merge_facts
+from app.compiled import GrammarCache, default_directory
+from app.env import EnvironmentVariables as EnvVariables
+from app.facts_xml import build_xml, get_xml, write_xml  # noqa: F401
+from app.versions import GRAMMAR_VERSION
+from app.metrics import PARSER_BUDGET_HITS
 
 
 def join_spans(text, spans):
@@ -36,207 +21,171 @@ def join_spans(text, spans):
     )
 
 
-def get_facts(text):
-    QUOTE = in_(QUOTES)
-    HYPHEN = dictionary(['-', '—', '–'])
-    facts = OntoFacts()
-
-    parser = NamesExtractor(MorphVocab())
-    matches = parser(text)
-    match = [_.fact for _ in matches][0]
-    if match.first is not None:
-        # remove None
-        fio = [x for x in [match.last, match.first, match.middle] if x is not None]
-        facts.add_fact('Scientist', ' '.join(fio))
-
-    Department = fact(
-        'Department',
-        ['definition', 'name', 'position']
-    )
-
-    POSITION = rule(
-        morph_pipeline([
-            'доцент',
-            'аспирант',
-            'ассистент',
-            'профессор'
-        ])
-    )
-
-    NAME = rule(
-        QUOTE,
-        not_(QUOTE).repeatable(),
-        QUOTE
-    )
-    DEFINITION = rule(
-        morph_pipeline(['кафедра', 'отдел']),
-        NAME
-    ).interpretation(Department.definition)
-    POSITION_SET = rule(HYPHEN, POSITION.interpretation(Department.position))
-
-    department = rule(DEFINITION, POSITION_SET).interpretation(Department)
-
-    parser = Parser(department)
-    for match in parser.findall(text):
-        facts.add_fact('Department', match.fact.definition)
-
-    DISERTATION_TYPE = rule(
-        morph_pipeline([
-            "кандидатская",
-            "докторская",
-            "магистерская"
+class FactsParser:
+    """
+    Process-wide extraction engine. The configured pipeline stages are loaded
+    once in the constructor and reused for every document passed to get_facts.
+    Stages missing from the configuration are never loaded.
+
+    With a chunk size set, texts longer than it are parsed chunk by chunk,
+    optionally on a pool of processes, and the results are merged. The pool
+    is started from a fork server, not forked from a process whose threads
+    may hold locks, and every child builds a parser of the same settings.
+    Budget hits and word analyses of the children are counted here.
+
+    Every document gets a budget of Earley states and seconds, and every
+    grammar may get one of its own (0 turns a limit off). A grammar that runs
+    out of it stops with the matches found so far and the facts are marked
+    degraded. A chunk in the pool gets the whole states budget, the deadline
+    is shared by all the chunks of the document.
+
+    Compiled grammars are loaded from the `grammar_cache` directory, and
+    stored there when they are not in it yet; an empty one turns it off.
+
+    The morphological analyses of the last `morph_cache_size` words are kept
+    across documents, 0 turns that off.
+    """
+
+    def __init__(self, stages=None, chunk_size=None, chunk_overlap=None, chunk_workers=None,
+                 max_states=None, timeout=None, rule_max_states=None, rule_timeout=None, grammar_cache=None,
+                 morph_cache_size=None):
+        started_at = time.time()
+        # natasha and pymorphy2 come with the pipeline, only processes parsing texts load them
+        from app.pipeline import Pipeline, DEFAULT_STAGES
+
+        if stages is None:
+            stages = [name.strip() for name in EnvVariables.PARSER_STAGES.get_env(
+                ','.join(DEFAULT_STAGES)).split(',') if name.strip()]
+
+        self.max_states = max_states if max_states is not None else int(
+            EnvVariables.PARSER_MAX_STATES.get_env(500000))
+        self.timeout = timeout if timeout is not None else float(
+            EnvVariables.PARSER_TIMEOUT.get_env(60))
+        rule_limits = {
+            'max_states': rule_max_states if rule_max_states is not None else int(
+                EnvVariables.PARSER_RULE_MAX_STATES.get_env(0)),
+            'timeout': rule_timeout if rule_timeout is not None else float(
+                EnvVariables.PARSER_RULE_TIMEOUT.get_env(0)),
+        }
+        directory = grammar_cache if grammar_cache is not None else default_directory()
+        self.grammar_cache = GrammarCache(directory) if directory else None
+        if morph_cache_size is None:
+            morph_cache_size = int(EnvVariables.PARSER_MORPH_CACHE_SIZE.get_env(10000))
+        # what a chunk pool child builds its own parser from
+        self.settings = {
+            'stages': stages, 'chunk_size': 0, 'max_states': self.max_states, 'timeout': self.timeout,
+            'rule_max_states': rule_limits['max_states'], 'rule_timeout': rule_limits['timeout'],
+            'grammar_cache': directory or '', 'morph_cache_size': morph_cache_size,
+        }
+        self.pipeline = Pipeline(stages, rule_limits, self.grammar_cache, morph_cache_size)
+        self.pipeline.load()
+
+        self.chunk_size = chunk_size if chunk_size is not None else int(
+            EnvVariables.PARSER_CHUNK_SIZE.get_env(0))
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(
+            EnvVariables.PARSER_CHUNK_OVERLAP.get_env(300))
+        self.chunk_workers = chunk_workers if chunk_workers is not None else int(
+            EnvVariables.PARSER_CHUNK_WORKERS.get_env(1))
+        self._chunk_pool = None
+
+        self.warmup_time = time.time() - started_at
+
+    @property
+    def morph(self):
+        """ the analyzer every grammar tokenizes with, and its cache """
+        return self.pipeline.resources.morph
+
+    @property
+    def version(self):
+        """ identifies the rule set: the output for a text changes only when this does """
+        version = GRAMMAR_VERSION + ':' + ','.join(self.pipeline.names)
+        if self.chunk_size:
+            version += ':chunks={}/{}'.format(self.chunk_size, self.chunk_overlap)
+        return version
+
+    def budget(self):
+        """ the limits of one document, starting now """
+        return Budget(self.max_states or None, self.timeout or None)
+
+    def get_facts(self, text):
+        if not self.chunk_size or len(text) <= self.chunk_size:
+            document = self.pipeline.run(text, self.budget())
+            document.facts.degraded = document.degraded
+            return document.facts
+        return self.get_facts_chunked([text])
+
+    def get_facts_chunked(self, pieces):
+        """ parses text given as an iterable of str pieces chunk by chunk """
+        chunks = list(split_chunks(pieces, self.chunk_size, self.chunk_overlap))
+        texts = [text for _, text in chunks]
+        budget = self.budget()
+        if self.chunk_workers > 1 and len(chunks) > 1:
+            results = []
+            for groups, degraded, (hits, misses) in self.chunk_pool().map(_parse_chunk, texts, [budget] * len(texts)):
+                for hit in degraded:
+                    rule, limit = hit.rsplit(':', 1)
+                    PARSER_BUDGET_HITS.inc(rule=rule, limit=limit)
+                self.morph.count(hits, misses)
+                results.append((groups, degraded))
+        else:
+            results = [self.parse_chunk(text, budget) for text in texts]
+        facts = merge_facts(self.pipeline.names, [
+            (offset, groups) for (offset, _), (groups, _) in zip(chunks, results)
         ])
-    )
-
-    Thesis = fact(
-        'Thesis',
-        ['kind', 'title', 'speciality', 'degree', 'branch']
-    )
-
-    TITLE = rule(
-        not_(QUOTE).repeatable().optional(),
-        QUOTE,
-        not_(QUOTE).repeatable().interpretation(Thesis.title),
-        QUOTE
-    )
+        # chunks parsed here share one budget, and with it the hits of the chunks before them
+        facts.degraded = list(dict.fromkeys(hit for _, degraded in results for hit in degraded))
+        return facts
+
+    def parse_chunk(self, text, budget=None):
+        """ groups of the chunk with their positions, and the rules that ran out of budget on it """
+        document = self.pipeline.run(text, budget)
+        groups = [
+            (stage, start, stop, [[f.type, f.value] for f in group])
+            for (stage, start, stop), group in zip(document.sources, document.facts.groups)
+        ]
+        return groups, list(document.degraded)
 
-    THESIS_NAME = rule(
-        DISERTATION_TYPE.optional().interpretation(Thesis.kind),
-        morph_pipeline(['диссертация']),
-        TITLE
-    ).interpretation(Thesis)
+    def chunk_pool(self):
+        """ started on first use, the children load their models once, from the grammar cache when there is one """
+        if self._chunk_pool is None:
+            context = multiprocessing.get_context('forkserver')
+            # imported once by the server, the children are forked from it with the libraries loaded
+            context.set_forkserver_preload(['app.pipeline'])
+            self._chunk_pool = ProcessPoolExecutor(max_workers=self.chunk_workers, mp_context=context,
+                                                   initializer=_start_chunk_parser, initargs=(self.settings,))
+        return self._chunk_pool
 
-    DEGREE_TYPE = rule(
-        or_(normalized('кандидат'), normalized('доктор'))
-    )
 
-    Speciality = fact(
-        'Speciality',
-        ['code', 'hyphen', 'name']
-    )
+# parser of a chunk pool child
+_chunk_parser = None
 
-    SPECIALITY_CODE = rule(
-        rule(
-            INT.repeatable(),
-            eq('.'),
-            INT.repeatable(),
-            eq('.'),
-            INT.repeatable()
-        ).interpretation(Speciality.code),
-        HYPHEN.interpretation(Speciality.hyphen)
-    )
 
-    SPECIALITY_TITLE = rule(
-        SPECIALITY_CODE,
-        or_(rule(
-            QUOTE,
-            not_(QUOTE).repeatable().interpretation(Speciality.name),
-            QUOTE
-        ), rule(
-            not_(or_(
-                eq('.'),
-                eq(';'))
-            ).repeatable().interpretation(Speciality.name)
-        ))
-    ).interpretation(Speciality)
-
-    SCIENCE_DIRECTION = rule(
-        morph_pipeline([
-            'направление',
-            'специальность'
-        ])
-    )
+def _start_chunk_parser(settings):
+    global _chunk_parser
+    _chunk_parser = FactsParser(**settings)
 
-    Branch = fact(
-        'Branch',
-        ['name']
-    )
 
-    BRANCH = rule(
-        not_(eq('наук')).repeatable().interpretation(Branch.name.normalized()),
-    ).interpretation(Branch)
+def _parse_chunk(text, budget):
+    """ groups and budget hits of the chunk, and the word analyses it found in the cache and did not """
+    morph = _chunk_parser.morph
+    hits, misses = morph.hits, morph.misses
+    groups, degraded = _chunk_parser.parse_chunk(text, budget)
+    return groups, degraded, (morph.hits - hits, morph.misses - misses)
 
-    AcademicDegree = fact(
-        'AcademicDegree',
-        ['degree', 'branch', 'suffix']
-    )
 
-    ACADEMIC_DEGREE = rule(
-        DEGREE_TYPE.interpretation(AcademicDegree.degree.normalized()),
-        BRANCH.interpretation(AcademicDegree.branch),
-        eq('наук').interpretation(AcademicDegree.suffix)
-    ).interpretation(AcademicDegree)
+_parser = None
 
-    SPECIALITY_DEGREE = rule(
-        not_(or_(eq('кандидата'), eq('доктора'))).repeatable(),
-        ACADEMIC_DEGREE.interpretation(Thesis.degree)
-    )
 
-    SPECIALITY = rule(
-        SPECIALITY_DEGREE.optional(),
-        eq('по'),
-        SCIENCE_DIRECTION,
-        SPECIALITY_TITLE.interpretation(Thesis.speciality)
-    )
+def get_parser():
+    """ returns the process-wide FactsParser, building it on first use """
+    global _parser
+    if _parser is None:
+        _parser = FactsParser()
+    return _parser
 
-    thesis = rule(THESIS_NAME, SPECIALITY.optional()).interpretation(Thesis)
 
-    parser = Parser(thesis)
-    for match in parser.findall(text):
-        info = [
-            ['Thesis ', match.fact.title],
-        ]
-        if match.fact.speciality:
-            if match.fact.speciality.code:
-                if match.fact.speciality.hyphen:
-                    info.append(['Speciality', " ".join([
-                        match.fact.speciality.code,
-                        match.fact.speciality.hyphen,
-                        match.fact.speciality.name
-                    ])])
-                else:
-                    info.append(['Speciality', " ".join([
-                        match.fact.speciality.code,
-                        match.fact.speciality.name
-                    ])])
-            else:
-                info.append(['Speciality', match.fact.speciality.name])
-
-        if match.fact.degree:
-            info.append(['AcademicDegree', match.fact.degree.degree])
-            info.append(['BranchOfScience', match.fact.degree.branch.name])
-
-        facts.add_facts(info)
-
-    emb = NewsEmbedding()
-    morph_tagger = NewsMorphTagger(emb)
-    syntax_parser = NewsSyntaxParser(emb)
-    segmenter = Segmenter()
-    doc = Doc(text)
-
-    doc.segment(segmenter)
-    doc.tag_morph(morph_tagger)
-    doc.parse_syntax(syntax_parser)
-
-    return facts
-
-
-def get_xml(items, url):
-    xml = ET.Element('fdo_objects')
-    document = ET.SubElement(xml, 'document')
-    document.set('url', url)
-    document.set('date', '')
-    facts_element = ET.SubElement(document, 'facts')
-    for item in items:
-        fact_element = ET.SubElement(facts_element, 'Fact')
-        fact_element.set('FactID', str(item.id))
-        fact_element.set('LeadID', str(item.id))
-        for f in item.facts:
-            if f.value:
-                field = ET.SubElement(fact_element, f.type)
-                field.set('val', f.value)
-
-    return ET.tostring(xml, encoding='utf-8', method='xml').decode('utf-8')
+def get_facts(text):
+    return get_parser().get_facts(text)
 
 
 def pretty_print(xml):
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+import pymorphy2_dicts_ru
+from natasha import MorphVocab, Segmenter, Doc, NewsEmbedding, NewsMorphTagger, NewsSyntaxParser
+from natasha.morph.vocab import MorphForm
+from pymorphy2 import MorphAnalyzer as PymorphyAnalyzer
+from yargy.tokenizer import MorphTokenizer
+
+from app.budget import Budget, BudgetedParser
+from app.compiled import build_parser
+from app.grammars import TRIGGERS
+from app.morph import CachedMorphAnalyzer
+from app.ontology import OntoFacts
+from app.prefilter import Prefilter
+
+DEFAULT_STAGES = ['names', 'department', 'thesis']
+
+
+def load_morph_vocab():
+    """ natasha's MorphVocab, given the path of the dictionaries: looking it up scans every installed package """
+    vocab = MorphVocab.__new__(MorphVocab)
+    PymorphyAnalyzer.__init__(vocab, path=pymorphy2_dicts_ru.get_path(), result_type=MorphForm)
+    return vocab
+
+
+class Resources:
+    """
+    Models shared between stages. Every model is created on first access, so
+    nothing is loaded unless a configured stage asks for it.
+
+    Grammars are compiled by parser(), or loaded from `grammar_cache` when
+    one is given. They all share `tokenizer`, so the tokens of a document
+    are made once and every grammar runs on them. Its `morph` keeps the
+    analyses of the last `morph_cache_size` words for the next documents.
+    """
+
+    def __init__(self, grammar_cache=None, morph_cache_size=0):
+        self.grammar_cache = grammar_cache
+        self.morph_cache_size = morph_cache_size
+        self._morph_vocab = None
+        self._morph = None
+        self._tokenizer = None
+        self._embedding = None
+        self._segmenter = None
+
+    @property
+    def morph_vocab(self):
+        if self._morph_vocab is None:
+            self._morph_vocab = load_morph_vocab()
+        return self._morph_vocab
+
+    @property
+    def morph(self):
+        if self._morph is None:
+            self._morph = CachedMorphAnalyzer(self.morph_vocab, self.morph_cache_size)
+        return self._morph
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = MorphTokenizer(morph=self.morph)
+        return self._tokenizer
+
+    def parser(self, name):
+        """ yargy parser of a grammar of app.compiled.RULES """
+        return build_parser(name, self.tokenizer, self.grammar_cache)
+
+    def prefilter(self, name):
+        """ the tokens the grammar can start matching at, None for a grammar without trigger words """
+        if name not in TRIGGERS:
+            return None
+        return Prefilter(TRIGGERS[name], self.tokenizer.morph)
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            self._embedding = NewsEmbedding()
+        return self._embedding
+
+    @property
+    def segmenter(self):
+        if self._segmenter is None:
+            self._segmenter = Segmenter()
+        return self._segmenter
+
+
+class Document:
+    """ State of one text while it goes through the pipeline """
+
+    def __init__(self, text, budget=None):
+        self.text = text
+        self.facts = OntoFacts()
+        # (stage name, start, stop) of every group in facts, in the same order
+        self.sources = []
+        self.budget = budget or Budget()
+        self._tokens = None
+        self._doc = None
+
+    @property
+    def degraded(self):
+        """ the rules that ran out of budget, the facts are partial when there are any """
+        return self.budget.hits
+
+    def add_facts(self, stage, start, stop, facts):
+        self.facts.add_facts(facts)
+        self.sources.append((stage, start, stop))
+
+    def tokens(self, tokenizer):
+        """ the text tokenized and analyzed once, for every grammar of the pipeline """
+        if self._tokens is None:
+            self._tokens = list(tokenizer(self.text))
+        return self._tokens
+
+    def segmented(self, segmenter):
+        if self._doc is None:
+            self._doc = Doc(self.text)
+            self._doc.segment(segmenter)
+        return self._doc
+
+
+class Stage:
+    """
+    Named step of the extraction pipeline. Subclasses build their models in
+    load() and do the work in run(); load() is called at most once.
+    `limits` are the max_states and timeout of every grammar of the stage.
+    """
+    name = None
+    requires = ()
+
+    def __init__(self, resources, limits=None):
+        self.resources = resources
+        self.limits = limits or {}
+        self.loaded = False
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+            self.loaded = True
+
+    def load(self):
+        pass
+
+    def run(self, document):
+        raise NotImplementedError
+
+
+class GrammarStage(Stage):
+    """ Stage running the grammar of app.compiled.RULES named after it, on the tokens shared by the document """
+
+    def load(self):
+        self.parser = BudgetedParser(self.resources.parser(self.name), self.name,
+                                     prefilter=self.resources.prefilter(self.name), **self.limits)
+
+    def findall(self, document):
+        """ (match, fact) pairs of the grammar in the document """
+        return self.parser.findall(document.text, document.budget, document.tokens(self.resources.tokenizer))
+
+
+class NamesStage(GrammarStage):
+    # the grammar of natasha's NamesExtractor, run without the extractor
+    name = 'names'
+
+    def run(self, document):
+        found, match = next(iter(self.findall(document)), (None, None))
+        if found is None:
+            return
+        if match.first is not None:
+            # remove None
+            fio = [x for x in [match.last, match.first, match.middle] if x is not None]
+            document.add_facts(self.name, found.span.start, found.span.stop, [['Scientist', ' '.join(fio)]])
+
+
+class DepartmentStage(GrammarStage):
+    name = 'department'
+
+    def run(self, document):
+        for match, fact in self.findall(document):
+            document.add_facts(self.name, match.span.start, match.span.stop, [['Department', fact.definition]])
+
+
+class ThesisStage(GrammarStage):
+    name = 'thesis'
+
+    def run(self, document):
+        for match, fact in self.findall(document):
+            info = [
+                ['Thesis ', fact.title],
+            ]
+            if fact.speciality:
+                if fact.speciality.code:
+                    if fact.speciality.hyphen:
+                        info.append(['Speciality', " ".join([
+                            fact.speciality.code,
+                            fact.speciality.hyphen,
+                            fact.speciality.name
+                        ])])
+                    else:
+                        info.append(['Speciality', " ".join([
+                            fact.speciality.code,
+                            fact.speciality.name
+                        ])])
+                else:
+                    info.append(['Speciality', fact.speciality.name])
+
+            if fact.degree:
+                info.append(['AcademicDegree', fact.degree.degree])
+                info.append(['BranchOfScience', fact.degree.branch.name])
+
+            document.add_facts(self.name, match.span.start, match.span.stop, info)
+
+
+class MorphStage(Stage):
+    name = 'morph'
+
+    def load(self):
+        self.tagger = NewsMorphTagger(self.resources.embedding)
+
+    def run(self, document):
+        document.segmented(self.resources.segmenter).tag_morph(self.tagger)
+
+
+class SyntaxStage(Stage):
+    name = 'syntax'
+    requires = ('morph',)
+
+    def load(self):
+        self.parser = NewsSyntaxParser(self.resources.embedding)
+
+    def run(self, document):
+        document.segmented(self.resources.segmenter).parse_syntax(self.parser)
+
+
+# registration order is the execution order, it keeps fact group ids stable
+STAGES = OrderedDict((stage.name, stage) for stage in [
+    NamesStage,
+    DepartmentStage,
+    ThesisStage,
+    MorphStage,
+    SyntaxStage,
+])
+
+
+def resolve_stages(names):
+    """ expands the configured stage names with their dependencies, in execution order """
+    wanted = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in STAGES:
+            raise ValueError("Unknown pipeline stage: {}".format(name))
+        if name not in wanted:
+            wanted.add(name)
+            pending.extend(STAGES[name].requires)
+    return [name for name in STAGES if name in wanted]
+
+
+class Pipeline:
+    def __init__(self, stages=None, rule_limits=None, grammar_cache=None, morph_cache_size=0):
+        self.resources = Resources(grammar_cache, morph_cache_size)
+        self.stages = [
+            STAGES[name](self.resources, rule_limits)
+            for name in resolve_stages(stages or DEFAULT_STAGES)
+        ]
+
+    @property
+    def names(self):
+        return [stage.name for stage in self.stages]
+
+    def load(self):
+        for stage in self.stages:
+            stage.ensure_loaded()
+
+    def run(self, text, budget=None):
+        document = Document(text, budget)
+        for stage in self.stages:
+            stage.ensure_loaded()
+            stage.run(document)
+        return document
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from yargy.token import is_morph_token
+
+
+class Prefilter:
+    """
+    The tokens a grammar can start matching at: the ones with a normal form
+    of one of its trigger words, compared the way morph_pipeline compares
+    them. A single pass over the tokens looks every one up in the set of
+    normal forms, the parser only starts the rule there.
+    """
+
+    def __init__(self, words, morph):
+        self.normal_forms = set()
+        for word in words:
+            self.normal_forms.update(morph.normalized(word))
+
+    def matches(self, token):
+        if is_morph_token(token):
+            return any(form.normalized in self.normal_forms for form in token.forms)
+        return token.normalized in self.normal_forms
+
+    def starts(self, tokens):
+        """ the indexes of the chart columns the rule is started in, the column before every trigger token """
+        return {index for index, token in enumerate(tokens) if self.matches(token)}
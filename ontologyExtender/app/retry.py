@@ -0,0 +1,81 @@
+import time
+
+
+class RetryPolicy:
+    """
+    Decides what happens to a message whose job failed: it is sent to the
+    retry topic with an exponentially growing delay, or to the dead-letter
+    topic once it has been tried `max_attempts` times.
+    """
+
+    def __init__(self, max_attempts=5, backoff=30, max_delay=3600):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """ seconds to wait before the given attempt, the second one waits `backoff` """
+        return min(self.backoff * 2 ** (attempt - 2), self.max_delay)
+
+    def exhausted(self, message):
+        return attempt_of(message) >= self.max_attempts
+
+    def retry(self, message, error):
+        """ the message to put on the retry topic """
+        attempt = attempt_of(message) + 1
+        return dict(message, attempt=attempt, not_before=time.time() + self.delay(attempt), error=str(error))
+
+    def dead_letter(self, message, error):
+        """ the message to put on the dead-letter topic """
+        return dict(message, error=str(error), failed_at=time.time())
+
+
+def attempt_of(message):
+    return message.get('attempt', 1)
+
+
+def queue_wait(message):
+    """ seconds the message waited since it was produced, or since it became due for a retry """
+    queued_at = max(message.get('queued_at') or 0, message.get('not_before') or 0)
+    return round(time.time() - queued_at, 4) if queued_at else None
+
+
+class DelayedPartitions:
+    """
+    Holds back retry messages that are not due yet. The partition of such a
+    message is rewound to it and paused until its not_before time, so the
+    consumer keeps serving every other partition meanwhile.
+    """
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.paused = {}
+
+    def due(self, polled):
+        """
+        values of the polled records that may be handled now, in order, with
+        the time the record was produced at as `queued_at`
+        """
+        now = time.time()
+        messages = []
+        for partition, records in polled.items():
+            for record in records:
+                not_before = record.value.get('not_before')
+                if not_before is not None and not_before > now:
+                    self.consumer.seek(partition, record.offset)
+                    self.consumer.pause(partition)
+                    self.paused[partition] = not_before
+                    break
+                queued_at = record.timestamp / 1000 if record.timestamp and record.timestamp > 0 else None
+                messages.append(dict(record.value, queued_at=queued_at))
+        return messages
+
+    def resume(self):
+        """ resumes the partitions whose first message became due """
+        now = time.time()
+        assigned = self.consumer.assignment()
+        for partition, not_before in list(self.paused.items()):
+            if not_before <= now or partition not in assigned:
+                del self.paused[partition]
+                if partition in assigned:
+                    self.consumer.resume(partition)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+from collections import defaultdict
+
+# what a process of each role imports before it takes its first message
+ROLE_MODULES = {
+    'parse': ['app.worker', 'app.pipeline'],
+    'fill': ['app.worker'],
+}
+# what the worker imports once it builds its clients
+CLIENT_MODULES = ['boto3', 'pusher']
+
+
+def import_times(modules):
+    """ microseconds spent importing every module, in a fresh interpreter: {name: (self, cumulative)} """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def profile(roles, top=15):
+    """ prints how long the imports of the given roles take, by package and by module """
+    modules = sorted({module for role in roles for module in ROLE_MODULES[role]}) + CLIENT_MODULES
+    times = import_times(modules)
+    packages = defaultdict(int)
+    for name, (own, _) in times.items():
+        packages[name.split('.')[0]] += own
+    total = sum(packages.values())
+
+    print("Imports of {}: {:.3f}s".format(', '.join(roles), total / 1e6))
+    print("{:<30} {:>10} {:>7}".format('package', 'self, s', 'share'))
+    for package, own in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print("{:<30} {:>10.3f} {:>6.1f}%".format(package, own / 1e6, 100 * own / total))
+    print("{:<50} {:>10}".format('module', 'total, s'))
+    for name, (_, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:top]:
+        print("{:<50} {:>10.3f}".format(name, cumulative / 1e6))
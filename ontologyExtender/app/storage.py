@@ -0,0 +1,72 @@
+import codecs
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+# objects bigger than this are spilled from memory to a temporary file
+SPOOL_SIZE = 1024 * 1024
+MULTIPART_SIZE = 8 * 1024 * 1024
+
+
+class InputTooLarge(Exception):
+    pass
+
+
+class Storage:
+    """
+    Streaming access to the bucket. Bodies are read chunk by chunk into
+    spooled temporary files and uploads go through the managed multipart
+    transfer, so no object has to be held in memory as a whole.
+    """
+
+    def __init__(self, s3, bucket, max_bytes=None):
+        self.s3 = s3
+        self.bucket = bucket
+        from boto3.s3.transfer import TransferConfig
+
+        self.max_bytes = max_bytes
+        self.transfer_config = TransferConfig(multipart_threshold=MULTIPART_SIZE, multipart_chunksize=MULTIPART_SIZE)
+
+    def chunks(self, key):
+        """ yields the raw body of the object, failing once it exceeds max_bytes """
+        body = self.s3.get_object(Bucket=self.bucket, Key=key)['Body']
+        size = 0
+        try:
+            for chunk in body.iter_chunks(CHUNK_SIZE):
+                size += len(chunk)
+                if self.max_bytes is not None and size > self.max_bytes:
+                    raise InputTooLarge("{} is larger than {} bytes".format(key, self.max_bytes))
+                yield chunk
+        finally:
+            body.close()
+
+    def download(self, key):
+        """ returns a binary file object positioned at the start of the object """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            for chunk in self.chunks(key):
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    def iter_text(self, key):
+        """ yields the object as UTF-8 text, decoded incrementally """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in self.chunks(key):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    def read_text(self, key):
+        return ''.join(self.iter_text(key))
+
+    def upload(self, key, fileobj):
+        self.s3.upload_fileobj(fileobj, self.bucket, key, Config=self.transfer_config)
+
+    def upload_file(self, key, path):
+        self.s3.upload_file(path, self.bucket, key, Config=self.transfer_config)
@@ -0,0 +1,97 @@
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+RESTART_DELAY = 1
+
+
+def run_child(target):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        target()
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def spawn(children, targets, index):
+    """ forks the worker running targets[index] and records its pid in `children` """
+    pid = os.fork()
+    if pid == 0:
+        run_child(targets[index])
+    children[pid] = index
+    print("Worker {} started, pid {}".format(index, pid))
+
+
+def handle_stop(children):
+    """ passes SIGTERM and SIGINT on to the children, returns a function telling whether one came """
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return lambda: bool(stopping)
+
+
+def wait_child():
+    """ waits for a child to exit: (pid, exit code, negative for a signal), None when none are left """
+    while True:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            return None
+        except InterruptedError:
+            continue
+        return pid, os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+
+def respawn(children, targets, stopping):
+    """ restarts every child that exits until a stop signal comes and the last one is gone """
+    while children:
+        exited = wait_child()
+        if exited is None:
+            break
+        pid, code = exited
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        print("Worker {} (pid {}) exited with code {}".format(index, pid, code))
+        if not stopping():
+            time.sleep(RESTART_DELAY)
+        if not stopping():
+            spawn(children, targets, index)
+
+
+def supervise(targets):
+    """
+    Forks one child per callable in `targets` and restarts the ones that die.
+    Everything loaded before the call (the parser models) is shared with the
+    children copy-on-write, so connections and clients must be created inside
+    the targets, after the fork.
+    """
+    # move the warm models out of the collector's reach: a full collection in a
+    # child would otherwise touch their headers and un-share the pages
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = handle_stop(children)
+    for index in range(len(targets)):
+        spawn(children, targets, index)
+    respawn(children, targets, stopping)
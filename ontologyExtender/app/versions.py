@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# bump whenever a rule in app/grammars.py changes: cached extraction and fill results are keyed by it
+GRAMMAR_VERSION = '1'
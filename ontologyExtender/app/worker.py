@@ -0,0 +1,488 @@
+import math
+import os
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from json import loads, dumps
+
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.errors import CommitFailedError
+from psycopg2 import Error
+
+from app.cache import cache_dir, content_key, LocalCache, ObjectStoreCache, TieredCache
+from app.db import Database, claim_tasks, fetch_tasks, stale_tasks, update_tasks, server_version
+from app.env import EnvironmentVariables as EnvVariables
+from app.extender import FillExecutor, BINARY_BACKEND
+from app.facts_xml import write_xml
+from app.metrics import REGISTRY, STAGE_SECONDS, JOBS, IN_FLIGHT, CONSUMER_LAG, Collector, JobTimings
+from app.notify import Notifier, PusherSink, LogSink, NullSink
+from app.ontology import OntoFacts
+from app.retry import RetryPolicy, DelayedPartitions, attempt_of, queue_wait
+from app.storage import Storage, SPOOL_SIZE
+from app.versions import GRAMMAR_VERSION
+
+
+PARSE = 'parse'
+FILL = 'fill'
+ROLES = [PARSE, FILL]
+
+# pending -> parsing -> parsed -> filling -> done, or failed from parsing or filling
+PENDING = 'pending'
+PARSING = 'parsing'
+PARSED = 'parsed'
+FILLING = 'filling'
+DONE = 'done'
+FAILED = 'failed'
+
+# kafka's default max_poll_interval_ms
+DEFAULT_POLL_INTERVAL = 300000
+
+
+def parse_topic():
+    return EnvVariables.KAFKA_TOPIC.get_env()
+
+
+def fill_topic():
+    return EnvVariables.KAFKA_FILL_TOPIC.get_env(parse_topic() + '_fill')
+
+
+def make_sink(name):
+    if name == 'pusher':
+        import pusher
+
+        return PusherSink(pusher.Pusher(
+            app_id=EnvVariables.PUSHER_APP_ID.get_env(),
+            key=EnvVariables.PUSHER_APP_KEY.get_env(),
+            secret=EnvVariables.PUSHER_APP_SECRET.get_env(),
+            cluster=EnvVariables.PUSHER_CLUSTER.get_env(),
+            ssl=True
+        ))
+    if name == 'log':
+        return LogSink()
+    if name == 'null':
+        return NullSink()
+    raise ValueError("Unknown notification sink: {}".format(name))
+
+
+def poll_interval(role, batch_size):
+    """
+    milliseconds a batch may take before the next poll, with headroom: a
+    consumer polling later than this is dropped from the group. Jobs without
+    a timeout are not bounded, they keep kafka's default.
+    """
+    if role == PARSE:
+        timeout = float(EnvVariables.PARSER_TIMEOUT.get_env(60))
+        rounds = batch_size
+    else:
+        timeout = float(EnvVariables.FILL_TIMEOUT.get_env() or 0)
+        rounds = math.ceil(batch_size / int(EnvVariables.FILL_CONCURRENCY.get_env(1)))
+    # downloads, uploads and the database come on top of the timeouts
+    return max(DEFAULT_POLL_INTERVAL, int((rounds * timeout * 1.5 + 60) * 1000))
+
+
+def events_topic():
+    return EnvVariables.KAFKA_EVENTS_TOPIC.get_env(parse_topic() + '_events')
+
+
+def retry_topic(topic):
+    return topic + '_retry'
+
+
+def dead_letter_topic(topic):
+    return topic + '_dlq'
+
+
+def file_size(fileobj):
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    return size
+
+
+def decode_message(value):
+    """ JSON message of the topic; anything else is wrapped, to be dead-lettered instead of stopping the consumer """
+    try:
+        message = loads(value.decode('utf-8'))
+    except ValueError:
+        return {'raw': value.decode('utf-8', 'replace')}
+    return message if isinstance(message, dict) else {'raw': message}
+
+
+class Worker:
+    """
+    Consumes the messages of one stage (parse or fill) in batches of up to
+    KAFKA_BATCH_SIZE. Every stage has its own topic and consumer group, so
+    parse and fill workers are scaled independently. Rows of a batch are
+    claimed with one statement and written back with one statement per kind
+    of update.
+
+    A claim moves a row to the working status of the stage under the id of
+    the worker, so a redelivered message or a second replica never processes
+    the same row twice. Claims older than CLAIM_TIMEOUT seconds are taken
+    over from workers that died with them.
+
+    Offsets are committed by hand once the results of a batch are stored and
+    the follow-up messages are flushed: a worker that dies mid-batch leaves
+    its messages to be delivered again. A failed job is put back to the
+    input status of its stage and goes to the retry topic of the stage, to be
+    tried again after a growing delay; after MAX_ATTEMPTS it is marked failed
+    and goes to the dead-letter topic.
+    """
+
+    def __init__(self, role, index=0, parser=None):
+        if role not in ROLES:
+            raise ValueError("Unknown worker role: {}".format(role))
+        self.role = role
+        self.parser = parser
+        self.index = index
+        self.worker_id = '{}-{}-{}-{}'.format(socket.gethostname(), os.getpid(), role, index)
+        self.claim_timeout = int(EnvVariables.CLAIM_TIMEOUT.get_env(1800))
+        self.kafka_topic = parse_topic() if role == PARSE else fill_topic()
+        self.bucket = EnvVariables.AWS_STORAGE_BUCKET_NAME.get_env()
+        self.batch_size = int(EnvVariables.KAFKA_BATCH_SIZE.get_env(1))
+        self.report_interval = int(EnvVariables.QUEUE_REPORT_INTERVAL.get_env(60))
+        self.reported_at = time.time()
+        self.retry_policy = RetryPolicy(max_attempts=int(EnvVariables.MAX_ATTEMPTS.get_env(5)),
+                                        backoff=int(EnvVariables.RETRY_BACKOFF.get_env(30)),
+                                        max_delay=int(EnvVariables.RETRY_MAX_DELAY.get_env(3600)))
+
+        # Connect to an existing database
+        self.db = Database(size=int(EnvVariables.PG_POOL_SIZE.get_env(4)),
+                           health_interval=int(EnvVariables.PG_HEALTH_CHECK_INTERVAL.get_env(30)),
+                           retries=int(EnvVariables.PG_RETRIES.get_env(5)),
+                           user=EnvVariables.PG_USER.get_env(),
+                           password=EnvVariables.PG_PASSWORD.get_env(),
+                           host=EnvVariables.PG_HOST.get_env(),
+                           port=EnvVariables.PG_PORT.get_env(),
+                           database=EnvVariables.PG_DATABASE.get_env())
+        # Print PostgreSQL version
+        print("You are connected to - ", self.db.run(server_version), " - PostgreSQL database")
+        print("kafka topic: ", self.kafka_topic, ", worker: ", role, index, ", batch size: ", self.batch_size)
+
+        max_poll_interval = poll_interval(role, self.batch_size)
+
+        self.consumer = KafkaConsumer(
+            self.kafka_topic,
+            retry_topic(self.kafka_topic),
+            bootstrap_servers=f'{EnvVariables.KAFKA_SERVER.get_env()}:{EnvVariables.KAFKA_PORT.get_env()}',
+            value_deserializer=decode_message,
+            group_id=EnvVariables.KAFKA_GROUP_ID.get_env('ontology-extender') + '-' + role,
+            auto_offset_reset='earliest',
+            enable_auto_commit=False,
+            max_poll_interval_ms=max_poll_interval,
+            # a rebalance waits for the slowest member up to max_poll_interval_ms, requests have to outlast it
+            request_timeout_ms=max_poll_interval + 5000,
+            connections_max_idle_ms=max(540000, max_poll_interval + 65000),
+            api_version=(0, 10, 1)
+        )
+        self.delayed = DelayedPartitions(self.consumer)
+        self.producer = KafkaProducer(
+            bootstrap_servers=f'{EnvVariables.KAFKA_SERVER.get_env()}:{EnvVariables.KAFKA_PORT.get_env()}',
+            value_serializer=lambda x: dumps(x).encode('utf-8'),
+            api_version=(0, 10, 1)
+        )
+        import boto3
+
+        self.s3 = boto3.client(
+            aws_access_key_id=EnvVariables.AWS_ACCESS_KEY_ID.get_env(),
+            aws_secret_access_key=EnvVariables.AWS_SECRET_ACCESS_KEY.get_env(),
+            region_name=EnvVariables.AWS_REGION_NAME.get_env(),
+            service_name='s3',
+            endpoint_url=EnvVariables.AWS_S3_ENDPOINT_URL.get_env()
+        )
+        self.storage = Storage(self.s3, self.bucket, int(EnvVariables.MAX_INPUT_SIZE.get_env(64)) * 1024 * 1024)
+        if role == PARSE:
+            self.facts_cache = TieredCache(
+                LocalCache(os.path.join(cache_dir(), 'facts'),
+                           int(EnvVariables.FACTS_CACHE_SIZE.get_env(64)) * 1024 * 1024),
+                ObjectStoreCache(self.storage, "/cache/facts/")
+            )
+        if role == FILL:
+            timeout = EnvVariables.FILL_TIMEOUT.get_env()
+            self.executor = FillExecutor(concurrency=int(EnvVariables.FILL_CONCURRENCY.get_env(1)),
+                                         timeout=int(timeout) if timeout else None,
+                                         backend=EnvVariables.FILL_BACKEND.get_env(BINARY_BACKEND))
+            # results are handed on by their S3 key and never read back here: no local copy to keep
+            self.fill_cache = ObjectStoreCache(self.storage, "/owl_filled/")
+            self.notifier = Notifier(make_sink(EnvVariables.NOTIFY_SINK.get_env('pusher')),
+                                     max_pending=int(EnvVariables.NOTIFY_QUEUE_SIZE.get_env(1000)))
+            REGISTRY.register(Collector('ontology_notifications', 'Pusher notifications by outcome, pending is a gauge',
+                                        ['outcome'], 'gauge',
+                                        lambda: {(k,): v for k, v in self.notifier.stats().items()}))
+        if role == PARSE:
+            morph = self.parser.morph
+            REGISTRY.register(Collector('ontology_morph_cache',
+                                        'Word analyses cache hits, misses, evictions, size in words and hit ratio',
+                                        ['event'], 'gauge', lambda: {(k,): v for k, v in morph.stats().items()}))
+        cache = self.facts_cache if role == PARSE else self.fill_cache
+        REGISTRY.register(Collector('ontology_cache', 'Cache hits, misses, evictions and local size in bytes',
+                                    ['cache', 'event'], 'gauge',
+                                    lambda: {(role, k): v for k, v in cache.stats().items()}))
+
+    def close(self):
+        if self.role == FILL:
+            self.executor.shutdown()
+            self.notifier.close()
+        # closing database connections.
+        self.db.close()
+        print("PostgreSQL connection is closed")
+
+    def run(self):
+        while True:
+            self.delayed.resume()
+            polled = self.consumer.poll(timeout_ms=1000, max_records=self.batch_size)
+            messages = self.delayed.due(polled)
+            if messages:
+                self.handle_batch(messages)
+            if polled:
+                # everything the batch produced is stored: only now it is safe to move past it
+                self.producer.flush()
+                try:
+                    self.consumer.commit()
+                except CommitFailedError as error:
+                    # the group moved the partitions on: the batch is delivered again and its claimed tasks skipped
+                    print("Could not commit the {} batch, it will be delivered again: ".format(self.role), error)
+            self.update_lag()
+            if time.time() - self.reported_at >= self.report_interval:
+                self.reported_at = time.time()
+                self.report()
+                self.requeue_stale()
+
+    def report(self):
+        print("{} queue depth: {} (worker {})".format(self.role, self.queue_depth(), self.index))
+        cache = self.facts_cache if self.role == PARSE else self.fill_cache
+        print("{} cache: {}".format(self.role, cache.stats()))
+        if self.role == FILL:
+            print("notifications: {}".format(self.notifier.stats()))
+        print("{} jobs: {}".format(self.role, {
+            outcome: JOBS.get(role=self.role, outcome=outcome)
+            for outcome in ['done', 'retried', 'recovered', 'dead_lettered']
+        }))
+
+    def update_lag(self):
+        """ lag of every assigned partition, from the high watermarks the last fetches reported """
+        CONSUMER_LAG.remove_all()
+        for partition in self.consumer.assignment():
+            highwater = self.consumer.highwater(partition)
+            if highwater is not None:
+                CONSUMER_LAG.set(highwater - self.consumer.position(partition),
+                                 topic=partition.topic, partition=partition.partition)
+
+    def requeue_stale(self):
+        """ sends the rows whose claims expired back to the topic, any worker of the stage may take them over """
+        task_ids = self.db.run(stale_tasks, PARSING if self.role == PARSE else FILLING, self.claim_timeout)
+        for task_id in task_ids:
+            self.producer.send(self.kafka_topic, {
+                "id": task_id,
+                "action": self.role,
+            })
+        if task_ids:
+            print("Requeued {} stale {} tasks".format(len(task_ids), self.role))
+
+    def handle_batch(self, messages):
+        jobs = {}
+        for message in messages:
+            if 'id' not in message or 'action' not in message:
+                print("Malformed message: ", message)
+                self.producer.send(dead_letter_topic(self.kafka_topic), message)
+                JOBS.inc(role=self.role, outcome='dead_lettered')
+            elif message['action'] == self.role:
+                jobs[message['id']] = message
+        if not jobs:
+            return
+        if self.role == PARSE:
+            self.parse(jobs)
+        else:
+            self.fill(jobs)
+
+    def settle(self, messages, failed, retry_status):
+        """
+        status rows for the failed (task id, error) pairs of a batch and the
+        messages to send once they are stored: the job goes back to
+        `retry_status` and to the retry topic, or, out of attempts, is marked
+        failed and dead-lettered
+        """
+        rows = []
+        outgoing = []
+        for task_id, error in failed:
+            message = messages[task_id]
+            if self.retry_policy.exhausted(message):
+                rows.append((task_id, FAILED))
+                outgoing.append((dead_letter_topic(self.kafka_topic), self.retry_policy.dead_letter(message, error)))
+                outgoing.append((events_topic(), {
+                    "id": task_id,
+                    "action": "error",
+                    "error": str(error)
+                }))
+                JOBS.inc(role=self.role, outcome='dead_lettered')
+            else:
+                rows.append((task_id, retry_status))
+                outgoing.append((retry_topic(self.kafka_topic), self.retry_policy.retry(message, error)))
+                JOBS.inc(role=self.role, outcome='retried')
+        return rows, outgoing
+
+    def count_done(self, messages, task_ids):
+        for task_id in task_ids:
+            JOBS.inc(role=self.role, outcome='done')
+            if attempt_of(messages[task_id]) > 1:
+                JOBS.inc(role=self.role, outcome='recovered')
+
+    def queue_depth(self):
+        """ messages left in the partitions assigned to this worker """
+        partitions = list(self.consumer.assignment())
+        if not partitions:
+            return 0
+        end_offsets = self.consumer.end_offsets(partitions)
+        return sum(end_offsets[tp] - self.consumer.position(tp) for tp in partitions)
+
+    def fill_task(self, record, timings):
+        """ runs on an executor thread: fills the ontology of one record and uploads the result """
+        with IN_FLIGHT.track(role=FILL):
+            download_started = time.time()
+            with self.storage.download(record['facts']) as facts_file, \
+                    self.storage.download(record['owl']) as owl_file:
+                timings.add('download', time.time() - download_started)
+                # identical inputs give an identical ontology: reuse the stored result
+                key = content_key(owl_file, facts_file, GRAMMAR_VERSION, self.executor.backend) + '.owl'
+                timings['owl_bytes'] = file_size(owl_file)
+                timings['facts_bytes'] = file_size(facts_file)
+                timings['cached'] = self.fill_cache.exists(key)
+                if timings['cached']:
+                    print("Fill cache hit: ", key)
+                    return self.fill_cache.path(key)
+
+                with self.executor.run(owl_file, facts_file) as run:
+                    timings.add('fill', run.wall_time)
+                    with timings.stage('upload'):
+                        self.fill_cache.put_file(key, run.result)
+        return self.fill_cache.path(key)
+
+    def extract(self, text):
+        """ facts of the text, taken from the cache when the same text was parsed by the same rule set """
+        key = content_key(text, self.parser.version) + '.json'
+        cached = self.facts_cache.get(key)
+        if cached is not None:
+            return OntoFacts.loads(cached.decode('utf-8'))
+
+        facts = self.parser.get_facts(text)
+        # partial facts are not reused, the next run may have the time to find them all
+        if not facts.degraded:
+            self.facts_cache.put(key, facts.dumps().encode('utf-8'))
+        return facts
+
+    def parse_task(self, record, timings):
+        """ extracts the facts of one record and uploads them, returns the key of the facts file """
+        with IN_FLIGHT.track(role=PARSE):
+            with timings.stage('download'):
+                text_content = self.storage.read_text(record['text'])
+
+            print(len(text_content))
+            timings['text_chars'] = len(text_content)
+
+            with timings.stage('extract'):
+                facts = self.extract(text_content)
+            timings['groups'] = len(facts.groups)
+            if facts.degraded:
+                timings['degraded'] = facts.degraded
+            timings['facts'] = sum(len(group.facts) for group in facts)
+
+            # generate id for the owl file (random)
+            facts_file = "/facts/" + str(uuid.uuid4()) + ".xml"
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+                with timings.stage('xml'):
+                    write_xml(facts, record['name'], spool)
+                timings['facts_bytes'] = spool.tell()
+                spool.seek(0)
+                with timings.stage('upload'):
+                    self.storage.upload(facts_file, spool)
+        return facts_file
+
+    def parse(self, messages):
+        task_ids = list(messages)
+        with STAGE_SECONDS.time(role=PARSE, stage='claim'):
+            records = self.db.run(claim_tasks, task_ids, ['text', 'owl', 'name'],
+                                  PENDING, PARSING, self.worker_id, self.claim_timeout)
+        parsed = []
+        failed = []
+        for task_id in task_ids:
+            record = records.get(task_id)
+            if record is None:
+                continue
+            timings = JobTimings(PARSE)
+            timings['queue_wait'] = queue_wait(messages[task_id])
+            try:
+                parsed.append((task_id, self.parse_task(record, timings), PARSED, {PARSE: timings}))
+            except Exception as e:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                print("parsing error at line ({0}): {1} ".format(exc_tb.tb_lineno, e))
+                failed.append((task_id, e))
+
+        statuses, outgoing = self.settle(messages, failed, PENDING)
+
+        def store(cursor):
+            update_tasks(cursor, ['facts', 'status', 'timings'], parsed, self.worker_id)
+            update_tasks(cursor, ['status'], statuses, self.worker_id)
+
+        with STAGE_SECONDS.time(role=self.role, stage='store'):
+            self.db.run(store)
+        self.count_done(messages, [task_id for task_id, *_ in parsed])
+
+        fill_ids = [task_id for task_id, *_ in parsed]
+        # a message delivered again after its batch was stored, but before it was committed
+        unclaimed = [task_id for task_id in task_ids if task_id not in records]
+        if unclaimed:
+            rows = self.db.run(fetch_tasks, unclaimed, ['status'])
+            fill_ids += [task_id for task_id, row in rows.items() if row['status'] == PARSED]
+        for task_id in fill_ids:
+            outgoing.append((fill_topic(), {
+                "id": task_id,
+                "action": "fill",
+            }))
+        for topic, message in outgoing:
+            self.producer.send(topic, message)
+
+    def fill(self, messages):
+        with STAGE_SECONDS.time(role=FILL, stage='claim'):
+            records = self.db.run(claim_tasks, list(messages), ['facts', 'owl', 'name'],
+                                  PARSED, FILLING, self.worker_id, self.claim_timeout)
+        jobs = {}
+        for task_id in messages:
+            record = records.get(task_id)
+            # claimed by another worker, or already filled
+            if record is None:
+                continue
+            timings = JobTimings(FILL)
+            timings['queue_wait'] = queue_wait(messages[task_id])
+            jobs[task_id] = (self.executor.submit(self.fill_task, record, timings), timings)
+
+        done = []
+        failed = []
+        for task_id, (job, timings) in jobs.items():
+            try:
+                done.append((task_id, job.result(), DONE, {FILL: timings}))
+            except (Exception, Error) as error:
+                print("Error while producing ontology filler task: ", error)
+                failed.append((task_id, error))
+
+        statuses, outgoing = self.settle(messages, failed, PARSED)
+
+        def store(cursor):
+            update_tasks(cursor, ['result', 'status', 'timings'], done, self.worker_id)
+            update_tasks(cursor, ['status'], statuses, self.worker_id)
+
+        with STAGE_SECONDS.time(role=self.role, stage='store'):
+            self.db.run(store)
+        self.count_done(messages, [task_id for task_id, *_ in done])
+        for topic, message in outgoing:
+            self.producer.send(topic, message)
+
+        for task_id, *_ in done:
+            self.producer.send(events_topic(), {
+                'id': task_id,
+                'action': 'done',
+            })
+            self.notifier.notify('ontologies-tasks', 'fill-event', task_id, {
+                'message': 'done',
+                'ontology_id': task_id
+            })
@@ -0,0 +1,102 @@
+# local texts for the benchmarks and the evaluation
+#
+#   python -m benchmarks.corpus        downloads the pages behind scripts/hand_filled.json into benchmarks/corpus
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, 'scripts')
+GOLD = os.path.join(SCRIPTS, 'hand_filled.json')
+TOMITA_INPUT = os.path.join(SCRIPTS, 'tomita-docker', 'tomita-parser', 'input')
+FETCHED = os.path.join(ROOT, 'benchmarks', 'corpus')
+DEFAULT_DIRS = [TOMITA_INPUT, FETCHED]
+
+# sections of a teacher page that follow the part the extractors look at, see scripts/import.py
+STOP_SECTIONS = [
+    "Научно-исследовательская работа",
+    "Организационно-методическая деятельность",
+    "Повышение квалификации",
+    "Основные публикации",
+    "Сведения из научно-технической библиотеки",
+]
+CONTENT_SELECTOR = 'body > div.boot > div.page > div > div.row.row-content > div > div'
+
+
+class Document:
+    def __init__(self, name, text, url=None):
+        self.name = name
+        self.text = text
+        self.url = url
+
+
+def load_gold(path=GOLD):
+    """ rows of the hand filled teachers table """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)[2]['data']
+
+
+def file_name(url):
+    """ name of the local copy of a page: the last part of its URL """
+    return os.path.splitext(url.rstrip('/').rsplit('/', 1)[-1])[0] + '.txt'
+
+
+def load(dirs=None, gold=GOLD):
+    """ documents of the given directories, sorted by name; texts fetched for the rows of `gold` get their URL """
+    urls = {file_name(row['url']): row['url'] for row in load_gold(gold)}
+    documents = []
+    for directory in dirs or DEFAULT_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path) or name.startswith('.'):
+                continue
+            with open(path, encoding='utf-8') as f:
+                documents.append(Document(name, f.read(), urls.get(name)))
+    return documents
+
+
+def page_text(html):
+    """ the part of a teacher page scripts/import.py extracts facts from """
+    from bs4 import BeautifulSoup
+
+    content = BeautifulSoup(html, 'html.parser').select_one(CONTENT_SELECTOR)
+    if content is None:
+        return None
+    text = content.text
+    for section in STOP_SECTIONS:
+        stop = text.find(section)
+        if stop != -1:
+            return text[:stop]
+    return text
+
+
+def fetch(destination=FETCHED, delay=0.5):
+    """ downloads the pages of the gold rows that are not there yet """
+    import requests
+
+    os.makedirs(destination, exist_ok=True)
+    for row in load_gold():
+        path = os.path.join(destination, file_name(row['url']))
+        if os.path.exists(path):
+            continue
+        try:
+            response = requests.get(row['url'], timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print("Failed to fetch {}: {}".format(row['url'], e))
+            continue
+        text = page_text(response.text)
+        if text is None:
+            print("No teacher profile in {}".format(row['url']))
+            continue
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print("Fetched", row['url'])
+        time.sleep(delay)
+
+
+if __name__ == '__main__':
+    fetch(sys.argv[1] if len(sys.argv) > 1 else FETCHED)
@@ -0,0 +1,76 @@
+# the extractors the benchmarks and the evaluation can run, by name
+import importlib.util
+import os
+import sys
+import time
+
+from benchmarks.corpus import SCRIPTS
+
+
+class Engine:
+    """
+    An extractor behind one interface: get_facts(text) returns OntoFacts.
+    `parsers` are the yargy parsers it runs, their Earley states are what
+    count_states() counts.
+    """
+
+    def __init__(self, name, get_facts, parsers, warmup_time):
+        self.name = name
+        self.get_facts = get_facts
+        self.parsers = parsers
+        self.warmup_time = warmup_time
+        self.states = 0
+
+    def count_states(self):
+        """ makes the parsers add every state they put into a chart column to self.states """
+        for parser in self.parsers:
+            for method in ('predict', 'scan', 'complete'):
+                setattr(parser, method, self._counting(getattr(parser, method)))
+
+    def _counting(self, method):
+        def wrap(column, *args):
+            before = len(column.states)
+            method(column, *args)
+            self.states += len(column.states) - before
+        return wrap
+
+
+def load_scripts():
+    """ the research parser of scripts/parser.py """
+    started_at = time.time()
+    # scripts/parser.py imports its siblings as top-level modules
+    if SCRIPTS not in sys.path:
+        sys.path.insert(0, SCRIPTS)
+    # loaded by path, the name `parser` is taken by the standard library module on python 3.8
+    spec = importlib.util.spec_from_file_location('scripts_parser', os.path.join(SCRIPTS, 'parser.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    parser = module.FactsParser()
+    parsers = [parser.parser_name.parser, parser.parser_department, parser.parser_thesis]
+    return Engine('scripts', parser.get_facts, parsers, time.time() - started_at)
+
+
+def load_app():
+    """ the worker's pipeline, with the stages configured in the environment """
+    started_at = time.time()
+    from app.budget import BudgetedParser
+    from app.parser import FactsParser
+
+    parser = FactsParser(chunk_size=0)
+    parsers = [
+        stage.parser.parser for stage in parser.pipeline.stages
+        if isinstance(getattr(stage, 'parser', None), BudgetedParser)
+    ]
+    return Engine('app', parser.get_facts, parsers, time.time() - started_at)
+
+
+ENGINES = {
+    'scripts': load_scripts,
+    'app': load_app,
+}
+
+
+def load(name):
+    if name not in ENGINES:
+        raise ValueError("Unknown engine: {}".format(name))
+    return ENGINES[name]()
@@ -0,0 +1,151 @@
+# scores the extractors against scripts/hand_filled.json on the local corpus, accuracy next to speed
+#
+#   python -m benchmarks.evaluate --engines scripts,app
+#
+# only documents whose URL is in the gold standard are scored, see benchmarks.corpus for where the URL comes from
+import argparse
+import json
+import time
+from collections import OrderedDict
+
+from benchmarks import corpus, engines
+from benchmarks.extraction import percentile
+
+# fields of a gold row, in report order, and the fact types filling the numbered ones
+FIELDS = ['name', 'department', 'thesis_1', 'thesis_2', 'speciality_1', 'speciality_2',
+          'degree_1', 'degree_2', 'branch_1', 'branch_2']
+NUMBERED = {
+    'Thesis': 'thesis_',
+    'Speciality': 'speciality_',
+    'AcademicDegree': 'degree_',
+    'BranchOfScience': 'branch_',
+}
+
+
+def clean(value):
+    """ gold rows use both None and "" for a missing value """
+    return ' '.join(value.split()) if value else ''
+
+
+def fields(facts):
+    """ the gold row fields filled from extracted facts, the same way scripts/import.py fills them """
+    row = {}
+    for group in facts:
+        for f in group:
+            kind = f.type.strip()
+            if kind == 'Scientist':
+                row.setdefault('name', f.value)
+            elif kind == 'Department':
+                row.setdefault('department', f.value)
+            elif kind in NUMBERED:
+                for number in (1, 2):
+                    key = NUMBERED[kind] + str(number)
+                    if key not in row:
+                        row[key] = f.value
+                        break
+    return {field: clean(row.get(field)) for field in FIELDS}
+
+
+class Score:
+    """
+    Per field counts: a value equal to the gold one is a true positive, a
+    different or unexpected value a false positive, and a gold value that was
+    not extracted exactly a false negative.
+    """
+
+    def __init__(self):
+        self.counts = OrderedDict((field, [0, 0, 0]) for field in FIELDS + ['all'])
+
+    def add(self, gold, extracted):
+        for field in FIELDS:
+            expected = clean(gold.get(field))
+            found = extracted[field]
+            for key in (field, 'all'):
+                counts = self.counts[key]
+                if found and found == expected:
+                    counts[0] += 1
+                    continue
+                if found:
+                    counts[1] += 1
+                if expected:
+                    counts[2] += 1
+
+    def report(self):
+        result = OrderedDict()
+        for field, (tp, fp, fn) in self.counts.items():
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            result[field] = {'tp': tp, 'fp': fp, 'fn': fn, 'precision': precision, 'recall': recall, 'f1': f1}
+        return result
+
+
+def evaluate(engine, documents, gold):
+    score = Score()
+    latencies = []
+    per_document = []
+    errors = 0
+    for document in documents:
+        started_at = time.time()
+        try:
+            extracted = fields(engine.get_facts(document.text))
+        except Exception:
+            errors += 1
+            extracted = fields([])
+        latency = time.time() - started_at
+        latencies.append(latency)
+        score.add(gold[document.url], extracted)
+        per_document.append({'url': document.url, 'latency': latency, 'fields': extracted})
+    latencies.sort()
+    return {
+        'engine': engine.name,
+        'warmup': engine.warmup_time,
+        'docs': len(documents),
+        'errors': errors,
+        'mean': sum(latencies) / len(latencies),
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': latencies[-1],
+        'fields': score.report(),
+        'documents': per_document,
+    }
+
+
+def report(result):
+    print("{engine}: {docs} documents, {errors} errors, latency mean {mean:.4f}s, "
+          "p50 {p50:.4f}s, p95 {p95:.4f}s, max {max:.4f}s".format(**result))
+    print("  {:<14} {:>5} {:>5} {:>5} {:>10} {:>10} {:>10}".format(
+        'field', 'tp', 'fp', 'fn', 'precision', 'recall', 'F1'))
+    for field, counts in result['fields'].items():
+        print("  {:<14} {tp:>5} {fp:>5} {fn:>5} {precision:>10.3f} {recall:>10.3f} {f1:>10.3f}".format(field, **counts))
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('--corpus', nargs='+', default=corpus.DEFAULT_DIRS,
+                           help="directories with one plain text document per file")
+    arguments.add_argument('--gold', default=corpus.GOLD)
+    arguments.add_argument('--engines', default=','.join(engines.ENGINES))
+    arguments.add_argument('--output', help="writes the scores and every document's fields and latency as JSON")
+    args = arguments.parse_args()
+
+    gold = {row['url']: row for row in corpus.load_gold(args.gold)}
+    documents = [document for document in corpus.load(args.corpus, args.gold) if document.url in gold]
+    if not documents:
+        raise SystemExit("No gold standard documents in {}, run python -m benchmarks.corpus first".format(
+            ', '.join(args.corpus)))
+    print("{} of {} gold standard rows have a local text".format(len(documents), len(gold)))
+
+    results = []
+    for name in args.engines.split(','):
+        result = evaluate(engines.load(name), documents, gold)
+        report(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': time.time(), 'engines': results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# measures the extractors on the local corpus and writes the results as JSON, to compare runs across commits
+#
+#   python -m benchmarks.extraction --engines scripts,app --repeat 3
+#   python -m benchmarks.extraction --baseline benchmarks/results/extraction-<commit>-<time>.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import corpus, engines
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(values, share):
+    """ nearest-rank percentile of sorted values """
+    return values[min(len(values) - 1, int(len(values) * share))] if values else None
+
+
+def git_state():
+    def git(*args):
+        return subprocess.run(['git'] + list(args), cwd=corpus.ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    try:
+        return {
+            'commit': git('rev-parse', 'HEAD') or None,
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        }
+    except OSError:
+        return {'commit': None, 'dirty': None}
+
+
+def bench(name, documents, repeat):
+    """
+    runs in a process of its own, so the peak RSS is the one of this engine;
+    states, errors and facts are per pass over the corpus
+    """
+    engine = engines.load(name)
+    engine.count_states()
+    latencies = []
+    states = []
+    errors = 0
+    facts = 0
+    started_at = time.time()
+    for _ in range(repeat):
+        for document in documents:
+            engine.states = 0
+            document_started_at = time.time()
+            try:
+                facts += sum(len(group.facts) for group in engine.get_facts(document.text))
+            except Exception:
+                errors += 1
+            latencies.append(time.time() - document_started_at)
+            states.append(engine.states)
+    elapsed = time.time() - started_at
+    latencies.sort()
+    states.sort()
+    return {
+        'engine': name,
+        'warmup': engine.warmup_time,
+        'docs': len(latencies),
+        'docs_per_sec': len(latencies) / elapsed if elapsed else None,
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        # ru_maxrss is in kilobytes on linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'states': sum(states) // repeat,
+        'states_p95': percentile(states, 0.95),
+        'states_max': states[-1] if states else None,
+        'errors': errors // repeat,
+        'facts': facts // repeat,
+    }
+
+
+def run(names, documents, repeat):
+    results = []
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as pool:
+            results.append(pool.submit(bench, name, documents, repeat).result())
+    return results
+
+
+def report(results, baseline=None):
+    before = {result['engine']: result for result in (baseline or {}).get('engines', [])}
+    print("{:<8} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10} {:>7} {:>6}".format(
+        'engine', 'docs', 'docs/sec', 'p50, s', 'p95, s', 'p99, s', 'RSS, MB', 'states', 'errors', 'facts'))
+    for result in results:
+        print("{engine:<8} {docs:>6} {docs_per_sec:>9.2f} {p50:>9.4f} {p95:>9.4f} {p99:>9.4f} "
+              "{peak_rss_mb:>9.1f} {states:>10} {errors:>7} {facts:>6}".format(**result))
+        previous = before.get(result['engine'])
+        if previous:
+            print("{:<8} {:>6} {:>8.0%} {:>8.0%} {:>8.0%} {:>8.0%} {:>8.0%} {:>9.0%}".format(
+                '', 'vs', *[
+                    result[key] / previous[key] - 1 if previous[key] else 0
+                    for key in ('docs_per_sec', 'p50', 'p95', 'p99', 'peak_rss_mb', 'states')
+                ]))
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('--corpus', nargs='+', default=corpus.DEFAULT_DIRS,
+                           help="directories with one plain text document per file")
+    arguments.add_argument('--engines', default=','.join(engines.ENGINES))
+    arguments.add_argument('--repeat', type=int, default=1)
+    arguments.add_argument('--output', help="defaults to a file under benchmarks/results")
+    arguments.add_argument('--baseline', help="results of an earlier run to compare with")
+    args = arguments.parse_args()
+
+    documents = corpus.load(args.corpus)
+    if not documents:
+        raise SystemExit("No documents in {}, run python -m benchmarks.corpus first".format(', '.join(args.corpus)))
+
+    results = {
+        'git': git_state(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'corpus': {
+            'dirs': args.corpus,
+            'docs': len(documents),
+            'chars': sum(len(document.text) for document in documents),
+        },
+        'repeat': args.repeat,
+        'engines': run(args.engines.split(','), documents, args.repeat),
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report(results['engines'], baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS, exist_ok=True)
+        output = os.path.join(RESULTS, 'extraction-{}-{}.json'.format(
+            (results['git']['commit'] or 'unknown')[:8], time.strftime('%Y%m%d-%H%M%S')))
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print("Results written to", output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# compares the throughput of the fill backends on one ontology and one facts file
+#
+#   python -m benchmarks.fill ontology.owl facts.xml --jobs 20 --concurrency 4
+import argparse
+import io
+import statistics
+import time
+
+from app.extender import BACKENDS, BINARY, FillExecutor
+
+
+def fill_once(executor, owl, facts):
+    started_at = time.time()
+    with executor.run(io.BytesIO(owl), io.BytesIO(facts)):
+        pass
+    return time.time() - started_at
+
+
+def bench(backend, owl, facts, jobs, concurrency, binary=BINARY):
+    executor = FillExecutor(concurrency=concurrency, binary=binary, backend=backend)
+    try:
+        # the first run pays for imports and the JIT, it is not counted
+        fill_once(executor, owl, facts)
+        started_at = time.time()
+        futures = [executor.submit(fill_once, executor, owl, facts) for _ in range(jobs)]
+        latencies = sorted(future.result() for future in futures)
+        elapsed = time.time() - started_at
+    finally:
+        executor.shutdown()
+    return {
+        'backend': backend,
+        'jobs': jobs,
+        'concurrency': concurrency,
+        'jobs_per_sec': jobs / elapsed,
+        'mean': statistics.mean(latencies),
+        'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('owl')
+    arguments.add_argument('facts')
+    arguments.add_argument('--jobs', type=int, default=20)
+    arguments.add_argument('--concurrency', type=int, default=1)
+    arguments.add_argument('--backends', default=','.join(BACKENDS))
+    arguments.add_argument('--binary', default=BINARY)
+    args = arguments.parse_args()
+
+    with open(args.owl, 'rb') as f:
+        owl = f.read()
+    with open(args.facts, 'rb') as f:
+        facts = f.read()
+
+    print("{:<8} {:>6} {:>12} {:>10} {:>10}".format('backend', 'jobs', 'jobs/sec', 'mean, s', 'p95, s'))
+    for backend in args.backends.split(','):
+        result = bench(backend, owl, facts, args.jobs, args.concurrency, args.binary)
+        print("{backend:<8} {jobs:>6} {jobs_per_sec:>12.2f} {mean:>10.3f} {p95:>10.3f}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# measures how long a fresh process takes to get a ready FactsParser, with and without the compiled grammar cache
+#
+#   python -m benchmarks.startup --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.corpus import ROOT
+
+# runs in a fresh interpreter, so nothing is imported or loaded yet
+PROBE = """
+import json, time
+started_at = time.time()
+from app.parser import FactsParser
+imported_at = time.time()
+parser = FactsParser()
+print(json.dumps({'import': imported_at - started_at, 'warmup': parser.warmup_time, 'total': time.time() - started_at}))
+"""
+
+
+def probe(grammar_cache):
+    env = dict(os.environ, PARSER_GRAMMAR_CACHE=grammar_cache, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('--runs', type=int, default=3)
+    args = arguments.parse_args()
+
+    print("{:<10} {:>10} {:>10} {:>10}".format('cache', 'import, s', 'warmup, s', 'total, s'))
+    with tempfile.TemporaryDirectory() as directory:
+        modes = [
+            ('off', lambda: ''),
+            # an empty directory every run: compiles and stores the grammars
+            ('cold', lambda: tempfile.mkdtemp(dir=directory)),
+            ('warm', lambda: os.path.join(directory, 'warm')),
+        ]
+        probe(os.path.join(directory, 'warm'))
+        for mode, grammar_cache in modes:
+            runs = [probe(grammar_cache()) for _ in range(args.runs)]
+            print("{:<10} {:>10.3f} {:>10.3f} {:>10.3f}".format(mode, *[
+                statistics.median(run[key] for run in runs) for key in ('import', 'warmup', 'total')
+            ]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 # Здесь мы делаем пост запросы для извлечения всех преподов.
 # Затем извлекаем факты и записываем в таблицу excel.
-import json
 import logging
 import os
 import time
@@ -46,45 +45,7 @@ def import_teachers_sstu(local=False):
 
     duration = time.time() - start_time
 
-    with open('hand_filled.json', encoding='utf-8') as json_file:
-        standart = json.load(json_file)[2]['data']
-
-    if not local:
-        tp = 0  # correct matching
-        fp = 0  # wrong matching
-        fn = 0  # miss matching
-
-        for teacher in teachers:
-            for std in standart:
-                if std['url'] == teacher[0]:
-                    comparing = [
-                        [std['name'], teacher[1]],
-                        [std['department'], teacher[2]],
-                        [std['thesis_1'], teacher[3].get('thesis_1', "")],
-                        [std['thesis_2'], teacher[3].get('thesis_2', "")],
-                        [std['speciality_1'], teacher[3].get('speciality_1', "")],
-                        [std['speciality_2'], teacher[3].get('speciality_2', "")],
-                        [std['degree_1'], teacher[3].get('degree_1', "")],
-                        [std['degree_2'], teacher[3].get('degree_2', "")],
-                        [std['branch_1'], teacher[3].get('branch_1', "")],
-                        [std['branch_2'], teacher[3].get('branch_2', "")],
-                    ]
-                    for cmr in comparing:
-                        if cmr[0] != "" and cmr[1] != "":
-                            if cmr[0] == cmr[1]:
-                                tp += 1
-                            else:
-                                fp += 1
-                        elif cmr[0] == "" and cmr[1] != "":
-                            fn += 1
-
-        precision = tp / (tp + fp)
-        recall = tp / (tp + fn)
-        f = 2 * (precision * recall) / (precision + recall)
-
-        print("Precision: " + str(precision))
-        print("Recall: " + str(recall))
-        print("F: " + str(f))
+    # accuracy against hand_filled.json is measured offline: python -m benchmarks.evaluate
     print("Time: " + str(duration))
 
     # Записываем в файл
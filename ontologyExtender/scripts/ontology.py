@@ -36,6 +36,8 @@ class OntoFacts:
     def __init__(self):
         self.groups = []
         self.last_id = 0
+        # "rule:limit" of the rules that ran out of budget, the facts are partial when it is not empty
+        self.degraded = []
 
     def __iter__(self):
         return iter(self.groups)
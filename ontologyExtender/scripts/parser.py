@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
 import xml.etree.ElementTree as ET
+from collections import Counter
 from xml.dom.minidom import parseString
 
 from natasha import NamesExtractor, MorphVocab
@@ -17,47 +20,34 @@ from yargy.tokenizer import (
 
 from ontology import OntoFacts
 
-
-class TooManyStates(Exception): pass
-
-
-def capped(method):
-    def wrap(self, column, *args):
-        before = len(column.states)
-        method(self, column, *args)
-        after = len(column.states)
-
-        self.states += (after - before)
-        if self.cap and self.states > self.cap:
-            raise TooManyStates
-
-    return wrap
-
-
-class CappedParser(Parser):
-    def reset(self):
-        self.states = 0
-
-    def __init__(self, *args, cap=None, **kwargs):
-        self.states = None
-        self.cap = cap
-        self.reset()
-        Parser.__init__(self, *args, **kwargs)
-
-    def chart(self, *args, **kwargs):
-        self.reset()
-        return Parser.chart(self, *args, **kwargs)
-
-    predict = capped(Parser.predict)
-    scan = capped(Parser.scan)
-    complete = capped(Parser.complete)
+# the rules run within the budgets of the worker's parser, app/ is next to this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.budget import Budget, BudgetedParser  # noqa: E402
 
 
 class FactsParser:
-    def __init__(self):
+    """
+    Every document may spend `max_states` Earley states and `timeout` seconds
+    in all the rules together, and every rule `rule_max_states` and
+    `rule_timeout` on its own. A rule out of budget keeps the facts found
+    until then, lists itself in facts.degraded and counts in budget_hits.
+
+    All the rules use the tokenizer of the names extractor, a document is
+    tokenized and analyzed once and every rule runs on the same tokens. The
+    tokens and the budget are passed to every run, the parsers keep nothing
+    of a document and can still be called on a text of their own.
+    """
+
+    def __init__(self, max_states=500000, timeout=60, rule_max_states=None, rule_timeout=None):
         QUOTE = in_(QUOTES)
         HYPHEN = dictionary(['-', '—', '–'])
+        self.max_states = max_states
+        self.timeout = timeout
+        # "rule:limit" -> documents it happened on
+        self.budget_hits = Counter()
+
         self.parser_name = NamesExtractor(MorphVocab())
+        self.tokenizer = self.parser_name.parser.tokenizer
 
         Department = fact(
             'Department',
@@ -86,7 +76,7 @@ class FactsParser:
 
         department = rule(DEFINITION, POSITION_SET).interpretation(Department)
 
-        self.parser_department = CappedParser(department)
+        self.parser_department = Parser(department, tokenizer=self.tokenizer)
 
         DISERTATION_TYPE = rule(
             morph_pipeline([
@@ -189,21 +179,33 @@ class FactsParser:
 
         thesis = rule(THESIS_NAME, SPECIALITY.optional()).interpretation(Thesis)
 
-        self.parser_thesis = CappedParser(thesis)
+        self.parser_thesis = Parser(thesis, tokenizer=self.tokenizer)
+
+        self.rules = {
+            name: BudgetedParser(parser, name, max_states=rule_max_states, timeout=rule_timeout)
+            for name, parser in [('names', self.parser_name.parser), ('department', self.parser_department),
+                                 ('thesis', self.parser_thesis)]
+        }
 
     def get_facts(self, text):
         facts = OntoFacts()
-        matches = self.parser_name(text)
-        match = [_.fact for _ in matches][0]
-        if match.first is not None:
+        budget = Budget(self.max_states, self.timeout)
+        tokens = list(self.tokenizer(text))
+
+        def findall(name):
+            return [match for match, _ in self.rules[name].findall(text, budget=budget, tokens=tokens)]
+
+        matches = findall('names')
+        match = matches[0].fact.obj if matches else None
+        if match is not None and match.first is not None:
             # remove None
             fio = [x for x in [match.last, match.first, match.middle] if x is not None]
             facts.add_fact('Scientist', ' '.join(fio))
 
-        for match in self.parser_department.findall(text):
+        for match in findall('department'):
             facts.add_fact('Department', match.fact.definition)
 
-        for match in self.parser_thesis.findall(text):
+        for match in findall('thesis'):
             info = [
                 ['Thesis', match.fact.title],
             ]
@@ -229,6 +231,8 @@ class FactsParser:
 
             facts.add_facts(info)
 
+        facts.degraded.extend(budget.hits)
+        self.budget_hits.update(budget.hits)
         return facts
 
 
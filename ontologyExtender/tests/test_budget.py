@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from app.budget import Budget, BudgetedParser
+from app.compiled import RULES
+from app.pipeline import Resources
+
+TEXTS = [
+    'Иванов Иван Иванович. Кафедра «Физика» - доцент. Кандидатская диссертация «Методы анализа».',
+    'Петрова Анна Сергеевна, заведующий кафедрой теоретической механики. '
+    'Тема докторской диссертации: «Устойчивость упругих систем», специальность 01.02.04 - механика.',
+    'Сидоров С. С. работает в отделе кадров и на кафедре «Высшая математика» с 2001 года.',
+    'Текст без единого факта.',
+]
+
+
+def found(matches):
+    return [(match.span, fact.as_json) for match, fact in matches]
+
+
+class BudgetedParserTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.resources = Resources()
+
+    def test_same_matches_as_yargy_within_the_budget(self):
+        for name in RULES:
+            # the yargy parser a stage wraps, run on its own
+            parser = self.resources.parser(name)
+            prefilters = [None, self.resources.prefilter(name)]
+            for text in TEXTS:
+                expected = found((match, match.fact) for match in parser.findall(text))
+                for prefilter in prefilters:
+                    with self.subTest(name, text=text, prefilter=prefilter is not None):
+                        budget = Budget(max_states=10 ** 6, timeout=60)
+                        budgeted = BudgetedParser(parser, name, max_states=10 ** 5, prefilter=prefilter)
+                        tokens = list(self.resources.tokenizer(text))
+                        self.assertEqual(found(budgeted.findall(text, budget, tokens)), expected)
+                        self.assertEqual(budget.hits, [])
+
+    def test_grammars_find_something(self):
+        # the comparison above means little if the texts match nothing
+        for name in RULES:
+            parser = self.resources.parser(name)
+            with self.subTest(name):
+                self.assertTrue(any(found(BudgetedParser(parser, name).findall(text)) for text in TEXTS))
+
+    def test_budget_hit_keeps_the_rule_running_out_of_it(self):
+        parser = BudgetedParser(self.resources.parser('thesis'), 'thesis')
+        budget = Budget(max_states=10)
+        self.assertEqual(found(parser.findall(TEXTS[1], budget)), [])
+        self.assertEqual(budget.hits, ['thesis:states'])
+
+
+if __name__ == '__main__':
+    unittest.main()
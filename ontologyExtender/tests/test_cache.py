@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import io
+import tempfile
+import unittest
+
+from app.cache import content_key, LocalCache
+from app.morph import CachedMorphAnalyzer
+
+
+class ContentKeyTest(unittest.TestCase):
+    def test_part_boundaries_matter(self):
+        self.assertNotEqual(content_key('ab', 'c'), content_key('a', 'bc'))
+        self.assertNotEqual(content_key('a', ''), content_key('a'))
+
+    def test_str_bytes_and_files_hash_alike(self):
+        data = 'Кафедра «Физика»'.encode('utf-8')
+        f = io.BytesIO(data)
+        self.assertEqual(content_key(f, 'v1'), content_key(data, 'v1'))
+        self.assertEqual(content_key('Кафедра «Физика»', 'v1'), content_key(data, 'v1'))
+        # the file is rewound for whoever reads it next
+        self.assertEqual(f.read(), data)
+
+
+class LocalCacheTest(unittest.TestCase):
+    def test_least_recently_used_files_are_evicted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LocalCache(directory, max_bytes=10)
+            cache.put('a', b'aaaa')
+            cache.put('b', b'bbbb')
+            self.assertEqual(cache.get('a'), b'aaaa')
+            cache.put('c', b'cccc')
+            self.assertEqual((cache.get('b'), cache.exists('a'), cache.exists('c')), (None, True, True))
+            self.assertEqual((cache.size, cache.evictions), (8, 1))
+            # bigger than the whole cache, not stored
+            cache.put('d', b'd' * 11)
+            self.assertIsNone(cache.get('d'))
+
+            reopened = LocalCache(directory, max_bytes=10)
+            self.assertEqual((reopened.get('a'), reopened.get('c'), reopened.size), (b'aaaa', b'cccc', 8))
+
+
+class CachedMorphAnalyzerTest(unittest.TestCase):
+    def test_forms_of_recent_words_are_reused(self):
+        morph = CachedMorphAnalyzer(capacity=2)
+        forms = morph('кафедра')
+        self.assertIs(morph('Кафедра'), forms)
+        morph('физика')
+        morph('анализ')
+        self.assertIsNot(morph('кафедра'), forms)
+        self.assertEqual(morph('кафедра'), forms)
+        stats = morph.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['size']), (2, 4, 2, 2))
+
+        morph.count(hits=3, misses=1)
+        self.assertEqual((morph.stats()['hits'], morph.stats()['misses']), (5, 5))
+
+    def test_capacity_zero_turns_the_cache_off(self):
+        morph = CachedMorphAnalyzer()
+        morph('кафедра')
+        morph('кафедра')
+        self.assertEqual((morph.stats()['hits'], morph.stats()['size']), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
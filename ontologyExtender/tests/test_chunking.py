@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+
+from app.chunking import merge_facts, split_chunks
+
+MATCH = 'Кандидатская диссертация «Методы анализа»'
+# what the thesis grammar finds: the whole match, or its tail in a chunk starting after the first word
+THESIS = re.compile(r'(Кандидатская )?диссертация «[^»]*»')
+
+
+def find_groups(text):
+    return [
+        ('thesis', found.start(), found.end(), [['Thesis ', found.group(0)]])
+        for found in THESIS.finditer(text)
+    ]
+
+
+class MergeFactsTest(unittest.TestCase):
+    def test_boundary_inside_a_match(self):
+        text = 'Слово ' * 30 + MATCH + '. ' + 'Текст ' * 30
+        start = text.index(MATCH)
+        chunks = list(split_chunks([text], 70, 40))
+        # one chunk holds the whole match, the next one begins between its words and sees the tail only
+        self.assertIn(start + len('Кандидатская '), [offset for offset, _ in chunks])
+        self.assertTrue(any(MATCH in chunk for _, chunk in chunks))
+
+        facts = merge_facts(['thesis'], [(offset, find_groups(chunk)) for offset, chunk in chunks])
+
+        self.assertEqual([[(f.type, f.value) for f in group.facts] for group in facts.groups],
+                         [[('Thesis ', MATCH)]])
+
+    def test_matches_repeated_in_the_overlap(self):
+        chunks = [
+            (0, [('department', 10, 30, [['Department', 'a']]), ('department', 40, 60, [['Department', 'b']])]),
+            (35, [('department', 5, 25, [['Department', 'b']]), ('department', 30, 50, [['Department', 'c']])]),
+        ]
+        facts = merge_facts(['department'], chunks)
+        self.assertEqual([group.facts[0].value for group in facts.groups], ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import unittest
+
+import psycopg2
+
+from app.db import TABLE, Database, claim_tasks, fetch_tasks, stale_tasks, update_tasks
+from app.env import EnvironmentVariables as EnvVariables
+from app.worker import PARSE, PARSED, PARSING, PENDING, Worker
+
+# the columns of FilledOntology the worker reads and writes
+SCHEMA = """
+CREATE TABLE {} (
+    id serial PRIMARY KEY,
+    name text,
+    text text,
+    owl text,
+    facts text,
+    result text,
+    status text,
+    worker_id text,
+    claimed_at timestamptz,
+    timings jsonb
+)
+""".format(TABLE)
+
+
+def server_settings():
+    """ the server the worker would connect to, from the same PG_* variables """
+    return {
+        'user': EnvVariables.PG_USER.get_env(),
+        'password': EnvVariables.PG_PASSWORD.get_env(),
+        'host': EnvVariables.PG_HOST.get_env(),
+        'port': EnvVariables.PG_PORT.get_env(),
+    }
+
+
+class Producer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, topic, value):
+        self.sent.append((topic, value))
+
+
+class TasksTest(unittest.TestCase):
+    """ runs against a database of its own, created on the PG_* server and dropped afterwards """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.name = 'ontology_test_{}'.format(os.getpid())
+        try:
+            cls.admin = psycopg2.connect(database=EnvVariables.PG_DATABASE.get_env('postgres'), **server_settings())
+        except psycopg2.OperationalError as error:
+            raise unittest.SkipTest("No PostgreSQL server to test against: {}".format(error))
+        cls.admin.autocommit = True
+        with cls.admin.cursor() as cursor:
+            cursor.execute("CREATE DATABASE {}".format(cls.name))
+        cls.db = Database(size=2, retries=0, database=cls.name, **server_settings())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        with cls.admin.cursor() as cursor:
+            cursor.execute("DROP DATABASE {}".format(cls.name))
+        cls.admin.close()
+
+    def setUp(self):
+        def create(cursor):
+            cursor.execute("DROP TABLE IF EXISTS {}".format(TABLE))
+            cursor.execute(SCHEMA)
+        self.db.run(create)
+
+    def insert(self, status, worker_id=None, claimed_ago=None):
+        def insert(cursor):
+            cursor.execute(
+                "INSERT INTO {} (name, text, status, worker_id, claimed_at) "
+                "VALUES ('name', 'text', %s, %s, now() - %s * interval '1 second') RETURNING id".format(TABLE),
+                [status, worker_id, claimed_ago])
+            return cursor.fetchone()[0]
+        return self.db.run(insert)
+
+    def rows(self, ids):
+        return self.db.run(fetch_tasks, ids, ['status', 'worker_id'])
+
+    def claim(self, ids, worker_id, timeout=60):
+        return self.db.run(claim_tasks, ids, ['name'], PENDING, PARSING, worker_id, timeout)
+
+    def test_claim_takes_rows_in_the_status_once(self):
+        pending = [self.insert(PENDING), self.insert(PENDING)]
+        parsed = self.insert(PARSED)
+
+        self.assertEqual(self.claim(pending + [parsed], 'a'), {task_id: {'name': 'name'} for task_id in pending})
+        self.assertEqual(self.rows(pending + [parsed]), {
+            pending[0]: {'status': PARSING, 'worker_id': 'a'},
+            pending[1]: {'status': PARSING, 'worker_id': 'a'},
+            parsed: {'status': PARSED, 'worker_id': None},
+        })
+        # a redelivered message of another worker finds them taken
+        self.assertEqual(self.claim(pending, 'b'), {})
+
+    def test_claim_skips_rows_a_concurrent_claim_holds(self):
+        first, second = self.insert(PENDING), self.insert(PENDING)
+        holding = psycopg2.connect(database=self.name, **server_settings())
+        try:
+            with holding.cursor() as cursor:
+                cursor.execute("SELECT id FROM {} WHERE id = %s FOR UPDATE".format(TABLE), [first])
+            claimed = []
+            claiming = threading.Thread(target=lambda: claimed.append(self.claim([first, second], 'b')))
+            claiming.start()
+            claiming.join(10)
+            self.assertFalse(claiming.is_alive(), "the claim waited for the locked row")
+            self.assertEqual(list(claimed[0]), [second])
+        finally:
+            holding.rollback()
+            holding.close()
+
+    def test_expired_claims_are_requeued_and_taken_over(self):
+        expired = self.insert(PARSING, 'a', claimed_ago=3600)
+        fresh = self.insert(PARSING, 'a', claimed_ago=0)
+        self.assertEqual(self.db.run(stale_tasks, PARSING, 60), [expired])
+
+        worker = Worker.__new__(Worker)
+        worker.role, worker.kafka_topic, worker.claim_timeout = PARSE, 'parse', 60
+        worker.db, worker.producer = self.db, Producer()
+        worker.requeue_stale()
+        self.assertEqual(worker.producer.sent, [('parse', {'id': expired, 'action': PARSE})])
+
+        self.assertEqual(list(self.claim([expired, fresh], 'b')), [expired])
+        self.assertEqual(self.rows([expired])[expired]['worker_id'], 'b')
+        self.assertEqual(self.db.run(stale_tasks, PARSING, 60), [])
+
+    def test_updates_only_rows_the_worker_still_owns(self):
+        task_id = self.insert(PENDING)
+        self.claim([task_id], 'a')
+        self.db.run(update_tasks, ['timings'], [(task_id, {'parse': 1.5})])
+        # the claim expires and another worker takes the row over
+        self.db.run(lambda cursor: cursor.execute(
+            "UPDATE {} SET claimed_at = now() - interval '1 hour'".format(TABLE)))
+        self.db.run(claim_tasks, [task_id], ['name'], PENDING, PARSING, 'b', 60)
+
+        self.db.run(update_tasks, ['status', 'timings'], [(task_id, PARSED, {'fill': 1})], 'a')
+        self.assertEqual(self.rows([task_id])[task_id]['status'], PARSING)
+        self.db.run(update_tasks, ['status', 'timings'], [(task_id, PARSED, {'fill': 2})], 'b')
+        self.assertEqual(self.db.run(fetch_tasks, [task_id], ['status', 'timings'])[task_id],
+                         {'status': PARSED, 'timings': {'parse': 1.5, 'fill': 2}})
+
+
+if __name__ == '__main__':
+    unittest.main()
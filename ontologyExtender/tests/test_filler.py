@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+import unittest
+
+from rdflib import Graph
+from rdflib.namespace import OWL, RDF, RDFS
+
+from app.extender import BINARY, BINARY_BACKEND, FillExecutor
+from app.filler import fill
+
+# worksAt and wrote relate classes by domain and range, hasSpeciality by a restriction, memberOf has no label
+ONTOLOGY = '''<?xml version="1.0"?>
+<rdf:RDF xmlns="http://example.org/sci#"
+     xml:base="http://example.org/sci"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#">
+    <owl:Ontology rdf:about="http://example.org/sci"/>
+    <owl:ObjectProperty rdf:about="http://example.org/sci#worksAt">
+        <rdfs:label>works at</rdfs:label>
+        <rdfs:domain rdf:resource="http://example.org/sci#Scientist"/>
+        <rdfs:range rdf:resource="http://example.org/sci#Department"/>
+    </owl:ObjectProperty>
+    <owl:ObjectProperty rdf:about="http://example.org/sci#wrote">
+        <rdfs:label>wrote</rdfs:label>
+        <rdfs:domain rdf:resource="http://example.org/sci#Scientist"/>
+        <rdfs:range rdf:resource="http://example.org/sci#Thesis"/>
+    </owl:ObjectProperty>
+    <owl:ObjectProperty rdf:about="http://example.org/sci#memberOf">
+        <rdfs:domain rdf:resource="http://example.org/sci#Scientist"/>
+        <rdfs:range rdf:resource="http://example.org/sci#Department"/>
+    </owl:ObjectProperty>
+    <owl:ObjectProperty rdf:about="http://example.org/sci#hasSpeciality">
+        <rdfs:label>has speciality</rdfs:label>
+    </owl:ObjectProperty>
+    <owl:Class rdf:about="http://example.org/sci#Scientist"><rdfs:label>Scientist</rdfs:label></owl:Class>
+    <owl:Class rdf:about="http://example.org/sci#Department"/>
+    <owl:Class rdf:about="http://example.org/sci#Speciality"><rdfs:label>Speciality</rdfs:label></owl:Class>
+    <owl:Class rdf:about="http://example.org/sci#AcademicDegree"><rdfs:label>AcademicDegree</rdfs:label></owl:Class>
+    <owl:Class rdf:about="http://example.org/sci#Thesis">
+        <rdfs:label>Thesis</rdfs:label>
+        <rdfs:subClassOf>
+            <owl:Restriction>
+                <owl:onProperty rdf:resource="http://example.org/sci#hasSpeciality"/>
+                <owl:someValuesFrom rdf:resource="http://example.org/sci#Speciality"/>
+            </owl:Restriction>
+        </rdfs:subClassOf>
+    </owl:Class>
+</rdf:RDF>
+'''
+
+
+def facts_xml(*groups):
+    facts = ''.join(
+        '<Fact FactID="{0}" LeadID="{0}">{1}</Fact>'.format(index, ''.join(
+            '<{} val="{}" />'.format(fact_type, value) for fact_type, value in group
+        ))
+        for index, group in enumerate(groups)
+    )
+    return '<fdo_objects><document url="x" date=""><facts>{}</facts></document></fdo_objects>'.format(facts)
+
+
+# facts.xml and what bin/OntologyExtender made of them with ONTOLOGY: (label, class) of every
+# new individual and (label, property, label) of every relation between them
+CASES = {
+    'scientist_merged_into_every_group': (facts_xml(
+        [('Scientist', 'Иванов Иван Иванович')],
+        [('Department', 'Кафедра «Физика»')],
+        [('Department', 'Отдел «Кадры»')],
+        [('Thesis', 'Методы анализа'), ('Speciality', '01.01.01 - анализ')],
+    ), {
+        ('Иванов Иван Иванович', 'Scientist'),
+        ('Кафедра «Физика»', 'Department'),
+        ('Отдел «Кадры»', 'Department'),
+        ('Методы анализа', 'Thesis'),
+        ('01.01.01 - анализ', 'Speciality'),
+        ('Иванов Иван Иванович', 'worksAt', 'Кафедра «Физика»'),
+        ('Иванов Иван Иванович', 'worksAt', 'Отдел «Кадры»'),
+        ('Иванов Иван Иванович', 'wrote', 'Методы анализа'),
+        ('Методы анализа', 'hasSpeciality', '01.01.01 - анализ'),
+    }),
+    'groups_with_the_same_fields_kept_apart': (facts_xml(
+        [('Scientist', 'Петров Пётр')],
+        [('Thesis', 'Первая'), ('Speciality', '01 физика')],
+        [('Thesis', 'Вторая'), ('Speciality', '02 химия')],
+    ), {
+        ('Петров Пётр', 'Scientist'),
+        ('Первая', 'Thesis'),
+        ('Вторая', 'Thesis'),
+        ('01 физика', 'Speciality'),
+        ('02 химия', 'Speciality'),
+        ('Петров Пётр', 'wrote', 'Первая'),
+        ('Петров Пётр', 'wrote', 'Вторая'),
+        ('Первая', 'hasSpeciality', '01 физика'),
+        ('Вторая', 'hasSpeciality', '02 химия'),
+    }),
+    'first_value_of_a_type_wins': (facts_xml(
+        [('Thesis', 'Первая')],
+        [('Thesis', 'Вторая'), ('Speciality', '02 химия'), ('AcademicDegree', 'кандидат')],
+    ), {
+        ('Первая', 'Thesis'),
+        ('02 химия', 'Speciality'),
+        ('кандидат', 'AcademicDegree'),
+        ('Первая', 'hasSpeciality', '02 химия'),
+    }),
+}
+
+
+def filled(path):
+    """ the individuals and relations of a filled ontology, by label """
+    graph = Graph()
+    graph.parse(path, format='xml')
+    individuals = set(graph.subjects(RDF.type, OWL.NamedIndividual))
+    result = set()
+    for subject, predicate, obj in graph:
+        if subject not in individuals:
+            continue
+        label = str(graph.value(subject, RDFS.label))
+        if predicate == RDF.type and obj != OWL.NamedIndividual:
+            result.add((label, obj.split('#')[-1]))
+        elif obj in individuals:
+            result.add((label, predicate.split('#')[-1], str(graph.value(obj, RDFS.label))))
+    return result
+
+
+class NativeFillerTest(unittest.TestCase):
+    def test_same_output_as_the_binary(self):
+        for name, (facts, expected) in CASES.items():
+            with self.subTest(name), tempfile.TemporaryDirectory() as directory:
+                result = os.path.join(directory, 'result.owl')
+                fill(io.BytesIO(ONTOLOGY.encode('utf-8')), io.BytesIO(facts.encode('utf-8')), result)
+                self.assertEqual(filled(result), expected)
+
+    @unittest.skipUnless(os.access(BINARY, os.X_OK), "OntologyExtender is not executable here")
+    def test_binary_still_does_the_same(self):
+        executor = FillExecutor(binary=BINARY, backend=BINARY_BACKEND)
+        try:
+            for name, (facts, expected) in CASES.items():
+                with self.subTest(name), tempfile.TemporaryDirectory() as directory:
+                    run = executor.run_binary(directory, io.BytesIO(ONTOLOGY.encode('utf-8')),
+                                              io.BytesIO(facts.encode('utf-8')))
+                    self.assertEqual(filled(run.result), expected)
+        finally:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
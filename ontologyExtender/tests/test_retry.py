@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import unittest
+from unittest import mock
+
+from app.env import EnvironmentVariables as EnvVariables
+from app.retry import RetryPolicy, attempt_of
+from app.worker import FAILED, PARSE, PENDING, Worker
+
+
+def parse_worker(policy):
+    # settle() only needs the topic, the policy and the role of the worker
+    worker = Worker.__new__(Worker)
+    worker.role, worker.kafka_topic, worker.retry_policy = PARSE, 'parse', policy
+    return worker
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_delay_doubles_up_to_the_limit(self):
+        policy = RetryPolicy(backoff=30, max_delay=100)
+        self.assertEqual([policy.delay(attempt) for attempt in range(2, 6)], [30, 60, 100, 100])
+
+    @mock.patch.dict(os.environ, {EnvVariables.KAFKA_TOPIC: 'parse', EnvVariables.KAFKA_EVENTS_TOPIC: 'events'})
+    def test_message_goes_through_retries_to_the_dead_letter_topic(self):
+        policy = RetryPolicy(max_attempts=3, backoff=10)
+        worker = parse_worker(policy)
+        message = {'id': 7, 'action': PARSE}
+        topics = []
+        while True:
+            rows, outgoing = worker.settle({7: message}, [(7, ValueError('broken'))], PENDING)
+            topics.append([topic for topic, _ in outgoing])
+            if rows != [(7, PENDING)]:
+                break
+            (_, message), = outgoing
+            self.assertGreaterEqual(message['not_before'], time.time() + policy.delay(message['attempt']) - 1)
+            self.assertEqual(message['error'], 'broken')
+
+        self.assertEqual(rows, [(7, FAILED)])
+        self.assertEqual(topics, [['parse_retry'], ['parse_retry'], ['parse_dlq', 'events']])
+        dead = outgoing[0][1]
+        self.assertEqual((dead['id'], attempt_of(dead), dead['error']), (7, 3, 'broken'))
+        self.assertIn('failed_at', dead)
+        self.assertEqual(outgoing[1][1], {'id': 7, 'action': 'error', 'error': 'broken'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import sys
+import unittest
+
+from benchmarks.corpus import SCRIPTS
+
+TEXT = 'Иванов Иван Иванович. Кафедра «Физика» - доцент. Кандидатская диссертация «Методы анализа».'
+
+
+def load_facts_parser():
+    # loaded the way benchmarks.engines loads it, scripts/parser.py imports its siblings as top-level modules
+    if SCRIPTS not in sys.path:
+        sys.path.insert(0, SCRIPTS)
+    spec = importlib.util.spec_from_file_location('scripts_parser', os.path.join(SCRIPTS, 'parser.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.FactsParser
+
+
+class ScriptsParserTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FactsParser = load_facts_parser()
+
+    def test_parsers_keep_nothing_of_a_document(self):
+        parser = self.FactsParser()
+        facts = parser.get_facts(TEXT)
+        self.assertEqual([[(f.type, f.value) for f in group.facts] for group in facts.groups], [
+            [('Scientist', 'Иванов Иван Иванович')],
+            [('Department', 'Кафедра «Физика»')],
+            [('Thesis', 'Методы анализа')],
+        ])
+
+        departments = parser.parser_department.findall('Отдел «Кадры» - профессор')
+        self.assertEqual([match.fact.definition for match in departments], ['Отдел «Кадры»'])
+        self.assertEqual([match.fact.last for match in parser.parser_name('Петров Пётр Петрович')], ['Петров'])
+
+    def test_rules_out_of_budget_keep_their_facts(self):
+        parser = self.FactsParser(rule_max_states=50)
+        facts = parser.get_facts(TEXT)
+        self.assertEqual(facts.degraded, ['names:states', 'department:states', 'thesis:states'])
+        self.assertEqual(parser.budget_hits['department:states'], 1)
+        # a second document starts with a budget of its own
+        self.assertEqual(parser.get_facts(TEXT).degraded, facts.degraded)
+
+
+if __name__ == '__main__':
+    unittest.main()